@@ -0,0 +1,103 @@
+"""Genre co-occurrence counts from the multi-hot genre matrix.
+
+The full genre x genre matrix is one sparse product, ``X.T @ X``, where
+``X`` is the anime x genre multi-hot matrix. Off the diagonal, entry
+``(i, j)`` counts anime tagged with both genres. On the diagonal, entry
+``(i, i)`` counts anime tagged with genre ``i``. Only anime with at least
+two genres are included, matching the original pair counting. The matrix
+is computed once; co-occurrence thresholds are applied to it as masks.
+
+:class:`CooccurrenceTimeline` stores one such matrix per release year as
+running totals, so the counts for any year window are one subtraction.
+"""
+from dataclasses import dataclass
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from animelens.genres import multi_hot
+
+
+def _multi_genre_rows(bits, vocab):
+    X = sparse.csr_matrix(multi_hot(bits, vocab), dtype=np.int64)
+    keep = np.flatnonzero(X.getnnz(axis=1) > 1)
+    return X[keep], keep
+
+
+def cooccurrence_matrix(bits, vocab):
+    """Dense genre x genre co-occurrence counts (int64) over ``vocab``."""
+    X, _ = _multi_genre_rows(bits, vocab)
+    return (X.T @ X).toarray()
+
+
+@dataclass
+class CooccurrenceTimeline:
+    """Per-year co-occurrence matrices stored as prefix sums along the years.
+
+    ``cumulative[i]`` is the sum of the matrices of ``years[:i]``, so it
+    has ``len(years) + 1`` entries and ``cumulative[0]`` is all zeros.
+    """
+    years: np.ndarray
+    cumulative: np.ndarray
+
+    def window(self, year_min, year_max):
+        """Co-occurrence counts of anime released in ``[year_min, year_max]``."""
+        start = np.searchsorted(self.years, year_min, side='left')
+        stop = np.searchsorted(self.years, year_max, side='right')
+        return self.cumulative[max(stop, start)] - self.cumulative[start]
+
+
+def cooccurrence_timeline(bits, years, vocab):
+    """Build a :class:`CooccurrenceTimeline`; anime without a year are left out."""
+    years = np.asarray(years, dtype='float64')
+    dated = ~np.isnan(years)
+    X, rows = _multi_genre_rows(np.asarray(bits)[dated], vocab)
+    row_years = years[dated][rows].astype(np.int64)
+
+    year_values = np.unique(years[dated]).astype(np.int64)
+    cumulative = np.zeros((len(year_values) + 1, len(vocab), len(vocab)), dtype=np.int64)
+    year_pos = np.searchsorted(year_values, row_years)
+    for i in range(len(year_values)):
+        X_year = X[year_pos == i]
+        cumulative[i + 1] = cumulative[i] + (X_year.T @ X_year).toarray()
+    return CooccurrenceTimeline(years=year_values, cumulative=cumulative)
+
+
+def genre_sizes(counts, vocab):
+    """Anime per genre (the matrix diagonal), for genres that appear at all."""
+    sizes = pd.Series(np.diag(counts), index=vocab)
+    return sizes[sizes > 0]
+
+
+def adjacency(counts, threshold):
+    """Co-occurrence counts with the diagonal and sub-threshold pairs zeroed."""
+    masked = np.where(counts >= threshold, counts, 0)
+    np.fill_diagonal(masked, 0)
+    return masked
+
+
+def pair_table(counts, vocab, threshold):
+    """Genre pairs co-occurring at least ``threshold`` times, most frequent first."""
+    rows, cols = np.triu_indices(len(vocab), k=1)
+    pair_counts = counts[rows, cols]
+    keep = pair_counts >= threshold
+    names = np.asarray(vocab, dtype=object)
+    pairs = pd.DataFrame({
+        'Genre 1': names[rows[keep]],
+        'Genre 2': names[cols[keep]],
+        'Co-occurrences': pair_counts[keep],
+    })
+    return pairs.sort_values('Co-occurrences', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def build_graph(counts, vocab, threshold):
+    """NetworkX graph of genres (``size`` node attribute) and thresholded pairs."""
+    G = nx.Graph()
+    for genre, size in genre_sizes(counts, vocab).items():
+        G.add_node(genre, size=int(size))
+
+    pairs = pair_table(counts, vocab, threshold)
+    G.add_weighted_edges_from(pairs.itertuples(index=False, name=None))
+    return G
@@ -0,0 +1,197 @@
+"""Country normalization of the free-text ``location`` column.
+
+Locations are split on commas (and slashes, pipes or semicolons); each part is looked up in an alias
+table mapping country names, abbreviations, native names, and
+well-known states, provinces and cities to a canonical country. The
+right-most part that matches wins, so "Paris, France" and "California,
+USA" both resolve. Locations with no match are ``Unknown`` instead of
+becoming a country of their own. Aliases that name places in more than
+one country are left out: "CA" is California and Canada, "DE" is
+Delaware and Germany, Victoria and Perth are Canadian and Scottish cities
+as well as Australian ones, and Birmingham, Manchester, Athens, Lima and
+Santiago are also US cities.
+
+A US state code (:data:`US_STATE_CODES`) at the end of a location counts
+only when no other part matched, so "Lima, OH" is the United States but
+"Berlin, DE" is still Germany.
+
+The matching runs once per distinct location, as vectorized string ops
+over the exploded parts. The result is a categorical column over the
+fixed :data:`COUNTRIES` list, so its codes can be used with
+``np.bincount``.
+"""
+import numpy as np
+import pandas as pd
+
+UNKNOWN_COUNTRY = 'Unknown'
+
+# Canonical country -> lower-case aliases, besides the name itself
+COUNTRY_ALIASES = {
+    'United States': [
+        'us', 'usa', 'u s', 'u s a', 'united states', 'united states of america', 'america', 'murica',
+        'alabama', 'alaska', 'arizona', 'arkansas', 'california', 'colorado', 'connecticut', 'delaware',
+        'florida', 'hawaii', 'idaho', 'illinois', 'indiana', 'iowa', 'kansas', 'kentucky',
+        'louisiana', 'maine', 'maryland', 'massachusetts', 'michigan', 'minnesota', 'mississippi',
+        'missouri', 'montana', 'nebraska', 'nevada', 'new hampshire', 'new jersey', 'new mexico',
+        'new york', 'north carolina', 'north dakota', 'ohio', 'oklahoma', 'oregon', 'pennsylvania',
+        'rhode island', 'south carolina', 'south dakota', 'tennessee', 'texas', 'utah', 'vermont',
+        'virginia', 'washington', 'west virginia', 'wisconsin', 'wyoming', 'puerto rico',
+        'ny', 'tx', 'fl', 'nyc', 'los angeles', 'san francisco', 'chicago', 'seattle', 'boston',
+        'houston', 'san diego', 'brooklyn',
+    ],
+    'Canada': [
+        'ontario', 'quebec', 'british columbia', 'alberta', 'manitoba', 'saskatchewan', 'nova scotia',
+        'new brunswick', 'newfoundland', 'toronto', 'vancouver', 'montreal', 'ottawa', 'calgary',
+    ],
+    'Mexico': ['mexico', 'méxico', 'mx', 'ciudad de mexico', 'guadalajara', 'monterrey'],
+    'Brazil': ['brasil', 'br', 'sao paulo', 'são paulo', 'rio de janeiro'],
+    'Argentina': ['buenos aires'],
+    'Chile': [],
+    'Colombia': ['bogota', 'bogotá'],
+    'Peru': ['perú'],
+    'Venezuela': [],
+    'United Kingdom': [
+        'uk', 'u k', 'gb', 'great britain', 'britain', 'england', 'scotland', 'wales', 'northern ireland',
+        'london',
+    ],
+    'Ireland': ['eire', 'dublin'],
+    'France': ['paris', 'lyon', 'marseille'],
+    'Germany': ['deutschland', 'berlin', 'munich', 'münchen', 'hamburg', 'bavaria', 'bayern'],
+    'Netherlands': ['the netherlands', 'holland', 'nederland', 'amsterdam'],
+    'Belgium': ['belgique', 'belgie', 'brussels'],
+    'Switzerland': ['schweiz', 'suisse', 'zurich'],
+    'Austria': ['österreich', 'osterreich', 'vienna', 'wien'],
+    'Italy': ['italia', 'rome', 'roma', 'milan', 'milano'],
+    'Spain': ['españa', 'espana', 'madrid', 'barcelona'],
+    'Portugal': ['lisbon', 'lisboa'],
+    'Poland': ['polska', 'warsaw', 'warszawa', 'krakow', 'kraków'],
+    'Czech Republic': ['czechia', 'ceska republika', 'prague', 'praha'],
+    'Hungary': ['magyarország', 'budapest'],
+    'Romania': ['bucharest'],
+    'Bulgaria': ['sofia'],
+    'Greece': [],
+    'Turkey': ['türkiye', 'turkiye', 'istanbul', 'ankara'],
+    'Russia': ['russian federation', 'россия', 'moscow', 'saint petersburg', 'st petersburg'],
+    'Ukraine': ['kiev', 'kyiv'],
+    'Sweden': ['sverige', 'stockholm'],
+    'Norway': ['norge', 'oslo'],
+    'Denmark': ['danmark', 'copenhagen'],
+    'Finland': ['suomi', 'helsinki'],
+    'Lithuania': [],
+    'Latvia': [],
+    'Estonia': [],
+    'Croatia': ['hrvatska'],
+    'Serbia': ['srbija', 'belgrade'],
+    'Japan': ['nihon', 'nippon', '日本', 'tokyo', 'osaka', 'kyoto'],
+    'South Korea': ['korea', 'republic of korea', 'seoul'],
+    'China': ['prc', 'beijing', 'shanghai'],
+    'Taiwan': ['taipei'],
+    'Hong Kong': ['hk'],
+    'Philippines': ['ph', 'pilipinas', 'manila', 'metro manila', 'quezon city', 'cebu', 'davao'],
+    'Indonesia': ['jakarta', 'bandung'],
+    'Malaysia': ['kuala lumpur', 'selangor'],
+    'Singapore': ['sg'],
+    'Thailand': ['bangkok'],
+    'Vietnam': ['viet nam', 'hanoi', 'ho chi minh city'],
+    'India': ['mumbai', 'delhi', 'new delhi', 'bangalore', 'kolkata', 'chennai'],
+    'Pakistan': ['karachi', 'lahore'],
+    'Bangladesh': ['dhaka'],
+    'Australia': ['aus', 'oz', 'sydney', 'melbourne', 'brisbane', 'queensland', 'new south wales'],
+    'New Zealand': ['nz', 'auckland', 'wellington'],
+    'Saudi Arabia': ['ksa', 'riyadh', 'jeddah'],
+    'United Arab Emirates': ['uae', 'dubai', 'abu dhabi'],
+    'Israel': ['tel aviv', 'jerusalem'],
+    'Egypt': ['cairo'],
+    'Morocco': [],
+    'Algeria': [],
+    'Tunisia': [],
+    'South Africa': ['cape town', 'johannesburg'],
+    'Nigeria': ['lagos'],
+}
+
+COUNTRIES = sorted(COUNTRY_ALIASES) + [UNKNOWN_COUNTRY]
+
+# Two-letter US state codes, besides the ones above; "CA" and "WA" also name Canada and Western Australia
+US_STATE_CODES = [
+    'al', 'ak', 'az', 'ar', 'co', 'ct', 'de', 'dc', 'ga', 'hi', 'id', 'il', 'in', 'ia', 'ks', 'ky', 'la',
+    'me', 'md', 'ma', 'mi', 'mn', 'ms', 'mo', 'mt', 'ne', 'nv', 'nh', 'nj', 'nm', 'nc', 'nd', 'oh', 'ok',
+    'or', 'pa', 'pr', 'ri', 'sc', 'sd', 'tn', 'ut', 'vt', 'va', 'wv', 'wi', 'wy',
+]
+
+# Separators between the parts of a location, e.g. "Hamburg/Germany"
+LOCATION_SEPARATORS = r'[,/|;]'
+
+
+def _normalize(text):
+    """Lower-case, replace punctuation with spaces and collapse whitespace."""
+    return text.str.lower().str.replace(r'[^\w\s]|_|\d', ' ', regex=True).str.split().str.join(' ')
+
+
+def _alias_codes():
+    aliases = {}
+    for code, country in enumerate(sorted(COUNTRY_ALIASES)):
+        for alias in [country.lower(), *COUNTRY_ALIASES[country]]:
+            aliases[alias] = code
+    names = _normalize(pd.Series(list(aliases)))
+    return pd.Series(list(aliases.values()), index=names).groupby(level=0).first()
+
+
+ALIAS_CODES = _alias_codes()
+
+
+def country_codes(location):
+    """Codes into :data:`COUNTRIES` for a ``location`` string column."""
+    location_codes, locations = pd.factorize(location)
+    parts = _normalize(pd.Series(locations, dtype=object).str.split(LOCATION_SEPARATORS, regex=True).explode())
+    parts = parts[parts.str.len() > 0]
+    matched = parts.map(ALIAS_CODES).dropna()
+    # Right-most matching part of each distinct location
+    best = matched.groupby(level=0).last()
+    # Otherwise a trailing state code after a city, e.g. "Dover, DE"
+    by_location = parts.groupby(level=0)
+    state = by_location.last().isin(US_STATE_CODES) & (by_location.size() > 1)
+    state = state.index[state].difference(best.index)
+
+    unknown = len(COUNTRIES) - 1
+    per_location = np.full(len(locations), unknown, dtype=np.int16)
+    per_location[best.index.to_numpy()] = best.to_numpy(dtype=np.int16)
+    per_location[state.to_numpy()] = COUNTRIES.index('United States')
+    return np.where(location_codes >= 0, per_location[location_codes], unknown).astype(np.int16)
+
+
+def normalize_countries(location):
+    """Categorical country column over :data:`COUNTRIES` for ``location``."""
+    return pd.Categorical.from_codes(country_codes(location), categories=COUNTRIES)
+
+
+# Locations with the country they must resolve to; check them with ``python -m animelens.countries``
+EXAMPLES = {
+    'Paris, France': 'France',
+    'California, USA': 'United States',
+    'Los Angeles, CA': 'United States',
+    'Toronto, CA': 'Canada',
+    'Victoria, BC': UNKNOWN_COUNTRY,
+    'Victoria, Canada': 'Canada',
+    'Perth, Scotland': 'United Kingdom',
+    'Melbourne, Victoria': 'Australia',
+    'Hamburg/Germany': 'Germany',
+    'Wilmington, DE': 'United States',
+    'Dover, DE': 'United States',
+    'Berlin, DE': 'Germany',
+    'Birmingham, AL': 'United States',
+    'Manchester, NH': 'United States',
+    'Athens, GA': 'United States',
+    'Lima, OH': 'United States',
+    'Tel Aviv, IL': 'Israel',
+    'Santiago, Dominican Republic': UNKNOWN_COUNTRY,
+    'London, UK': 'United Kingdom',
+    'DE': UNKNOWN_COUNTRY,
+    'somewhere': UNKNOWN_COUNTRY,
+}
+
+
+if __name__ == "__main__":
+    resolved = normalize_countries(pd.Series(list(EXAMPLES)))
+    wrong = {location: country for location, country in zip(EXAMPLES, resolved) if country != EXAMPLES[location]}
+    assert not wrong, f"Resolved differently than expected: {wrong}"
+    print(f"{len(EXAMPLES)} example locations resolve as expected")
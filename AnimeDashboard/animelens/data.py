@@ -0,0 +1,110 @@
+"""Data catalog shared by every dashboard page.
+
+The raw Kaggle CSVs are converted once into typed Parquet files under
+``data/cache``. Pages then read the same in-memory Arrow table instead of
+parsing the CSV on every load.
+"""
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from animelens.genres import encode_genres, genre_vocabulary
+
+DATA_DIR = Path(os.environ.get("ANIMELENS_DATA_DIR", Path(__file__).resolve().parent.parent / "data"))
+CACHE_DIR = DATA_DIR / "cache"
+
+# Query engine for the Regional Preferences page: "pandas" or "duckdb"
+REGIONAL_ENGINE = os.environ.get("ANIMELENS_REGIONAL_ENGINE", "pandas").lower()
+
+# Backend for the catalog queries of pages 1-4: "pandas" or "polars"
+QUERY_BACKEND = os.environ.get("ANIMELENS_QUERY_BACKEND", "pandas").lower()
+
+ANIME_CSV = DATA_DIR / "anime_cleaned.csv"
+USERS_CSV = DATA_DIR / "users_cleaned.csv"
+LISTS_CSV = DATA_DIR / "animelists_cleaned.csv"
+
+ANIME_PARQUET = CACHE_DIR / "anime.parquet"
+
+# Schema metadata keys; bump CATALOG_VERSION whenever the build output changes
+VERSION_METADATA_KEY = b'animelens.version'
+GENRES_METADATA_KEY = b'animelens.genres'
+CATALOG_VERSION = b'2'
+
+# Columns the pages treat as numbers; anything unparseable becomes NaN
+ANIME_NUMERIC_COLUMNS = [
+    'episodes', 'duration_min', 'aired_from_year', 'score', 'scored_by',
+    'rank', 'popularity', 'members', 'favorites',
+]
+
+
+def is_stale(artifact, *sources):
+    """Return True if ``artifact`` is missing or older than any source file."""
+    artifact = Path(artifact)
+    if not artifact.exists():
+        return True
+    built = artifact.stat().st_mtime
+    return any(Path(src).stat().st_mtime > built for src in sources)
+
+
+def write_parquet_atomic(table, path):
+    """Write ``table`` next to ``path`` and rename it into place."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def build_anime_parquet(csv_path=ANIME_CSV, parquet_path=ANIME_PARQUET):
+    """Parse the anime CSV once and store it as a typed Parquet file."""
+    df = pd.read_csv(csv_path)
+    df['anime_id'] = df['anime_id'].astype('int32')
+    for col in ANIME_NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+
+    vocab = genre_vocabulary(df['genre'])
+    df['genre_bits'] = encode_genres(df['genre'], vocab)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {
+        **(table.schema.metadata or {}),
+        VERSION_METADATA_KEY: CATALOG_VERSION,
+        GENRES_METADATA_KEY: json.dumps(vocab).encode(),
+    }
+    table = table.replace_schema_metadata(metadata)
+    write_parquet_atomic(table, parquet_path)
+    return table
+
+
+@lru_cache(maxsize=None)
+def anime_table():
+    """The anime catalog as an immutable Arrow table, shared process-wide."""
+    if is_stale(ANIME_PARQUET, ANIME_CSV):
+        return build_anime_parquet()
+    table = pq.read_table(ANIME_PARQUET)
+    if (table.schema.metadata or {}).get(VERSION_METADATA_KEY) != CATALOG_VERSION:
+        return build_anime_parquet()
+    return table
+
+
+def load_anime(columns=None):
+    """Return a fresh pandas copy of the anime catalog.
+
+    Pages are free to add or overwrite columns on the returned frame; the
+    shared Arrow table underneath is never modified.
+    """
+    table = anime_table()
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas()
+
+
+def catalog_genres():
+    """Genre vocabulary of the catalog; bit ``i`` of ``genre_bits`` is genre ``i``."""
+    return json.loads(anime_table().schema.metadata[GENRES_METADATA_KEY])
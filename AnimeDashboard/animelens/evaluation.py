@@ -0,0 +1,144 @@
+"""Cross-validation and learning curves for the success-prediction model.
+
+:func:`evaluate` splits the catalog into :data:`animelens.model.CV_FOLDS`
+stratified folds. For each fold it fits the forest on growing shares of
+the fold's training rows (:data:`TRAIN_SIZES`). Every (fold, size) fit is
+an independent joblib task, so the whole grid runs in parallel across
+cores. The full-size fit of each fold gives the fold's accuracy and ROC
+curve. The others trace the learning curve.
+
+Results are stored with joblib under ``data/cache/evaluations``. Each is
+keyed by the model key (which already covers the data and the
+hyperparameters) and the evaluation settings, so an evaluation runs once
+per model.
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import auc, roc_curve
+from sklearn.model_selection import StratifiedKFold
+
+from animelens.data import CACHE_DIR
+from animelens.model import CV_FOLDS, MODEL_PARAMS, SPLIT_SEED, fit_forest
+
+EVALUATION_DIR = CACHE_DIR / "evaluations"
+
+# Bump whenever the stored evaluation changes
+EVALUATION_VERSION = 1
+
+# Shares of each fold's training rows the learning curve is fitted on
+TRAIN_SIZES = [0.1, 0.25, 0.5, 0.75, 1.0]
+
+
+@dataclass
+class Evaluation:
+    """Cross-validation results of one model."""
+    key: str
+    folds: pd.DataFrame  # fold, accuracy, auc
+    roc: list            # per fold: (false positive rates, true positive rates)
+    curve: pd.DataFrame  # fold, train_size, train_rows, train_accuracy, test_accuracy
+
+    @property
+    def cv_scores(self):
+        return self.folds['accuracy'].to_numpy()
+
+    def curve_summary(self):
+        """Mean and standard deviation of the learning curve over folds, per training size."""
+        summary = self.curve.groupby('train_size').agg(
+            train_rows=('train_rows', 'mean'),
+            train_mean=('train_accuracy', 'mean'),
+            train_std=('train_accuracy', 'std'),
+            test_mean=('test_accuracy', 'mean'),
+            test_std=('test_accuracy', 'std'),
+        )
+        return summary.reset_index()
+
+
+def evaluation_key(model_key):
+    """Cache key for the evaluation of the model ``model_key``."""
+    config = {
+        'version': EVALUATION_VERSION,
+        'model': model_key,
+        'folds': CV_FOLDS,
+        'train_sizes': TRAIN_SIZES,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def evaluation_path(model_key):
+    return EVALUATION_DIR / f"{evaluation_key(model_key)}.joblib"
+
+
+def _fit_task(X, y, fold, train, test, size, params):
+    """Fit on the first ``size`` share of the shuffled ``train`` rows and score both sides."""
+    # Back in row order, so the full-size fit is exactly the plain cross-validation fit
+    rows = np.sort(train[:max(1, int(round(size * len(train))))])
+    clf = fit_forest(X[rows], y[rows], params)
+    result = {
+        'fold': fold,
+        'train_size': size,
+        'train_rows': len(rows),
+        'train_accuracy': clf.score(X[rows], y[rows]),
+        'test_accuracy': clf.score(X[test], y[test]),
+    }
+    if size == 1.0:
+        fpr, tpr, _ = roc_curve(y[test], clf.predict_proba(X[test])[:, 1])
+        result['roc'] = (fpr, tpr)
+    return result
+
+
+def evaluate(features, labels, params=MODEL_PARAMS, key=None, n_jobs=-1, progress=None):
+    """Cross-validate and trace learning curves with ``params``, all fits in parallel.
+
+    ``progress('folds', done, total)`` is called as fits finish.
+    """
+    X = features.to_numpy(dtype='float64')
+    y = labels.to_numpy()
+    rng = np.random.default_rng(SPLIT_SEED)
+    tasks = []
+    for fold, (train, test) in enumerate(StratifiedKFold(CV_FOLDS).split(X, y)):
+        # Learning-curve subsets are prefixes of a shuffled order
+        train = rng.permutation(train)
+        tasks += [delayed(_fit_task)(X, y, fold, train, test, size, params) for size in TRAIN_SIZES]
+
+    results = []
+    for result in Parallel(n_jobs=n_jobs, return_as='generator_unordered')(tasks):
+        results.append(result)
+        if progress is not None:
+            progress('folds', len(results), len(tasks))
+
+    full = sorted((r for r in results if 'roc' in r), key=lambda r: r['fold'])
+    folds = pd.DataFrame({
+        'fold': [r['fold'] for r in full],
+        'accuracy': [r['test_accuracy'] for r in full],
+        'auc': [auc(*r['roc']) for r in full],
+    })
+    curve = pd.DataFrame([{k: v for k, v in r.items() if k != 'roc'} for r in results])
+    return Evaluation(
+        key=key,
+        folds=folds,
+        roc=[r['roc'] for r in full],
+        curve=curve.sort_values(['train_size', 'fold']).reset_index(drop=True),
+    )
+
+
+def save_evaluation(evaluation):
+    """Write ``evaluation`` to the cache, renaming it into place."""
+    path = evaluation_path(evaluation.key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    joblib.dump(evaluation, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def load_evaluation(model_key):
+    """The cached evaluation of ``model_key``, or None if it has not run."""
+    path = evaluation_path(model_key)
+    return joblib.load(path) if path.exists() else None
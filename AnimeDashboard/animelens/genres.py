@@ -0,0 +1,80 @@
+"""Bitmask encoding of the comma-separated ``genre`` column.
+
+Each anime's genres are packed into one uint64, with bit ``i`` set when
+the anime has ``vocab[i]``. Genre filters become bitwise ops over the
+whole column, and per-genre counts come from a multi-hot matrix instead
+of splitting strings and exploding frames.
+"""
+import numpy as np
+import pandas as pd
+
+GENRE_SEPARATOR = ', '
+MAX_GENRES = 64
+
+
+def genre_vocabulary(genre):
+    """Sorted list of distinct genre names in a ``genre`` string column."""
+    tokens = genre.dropna().str.split(GENRE_SEPARATOR).explode()
+    return sorted(tokens[tokens != ''].unique())
+
+
+def encode_genres(genre, vocab):
+    """Pack a ``genre`` string column into uint64 bitmasks over ``vocab``.
+
+    Missing genre strings and names outside ``vocab`` contribute no bits.
+    """
+    if len(vocab) > MAX_GENRES:
+        raise ValueError(f"{len(vocab)} genres do not fit in a {MAX_GENRES}-bit mask")
+
+    tokens = genre.reset_index(drop=True).str.split(GENRE_SEPARATOR).explode().dropna()
+    positions = pd.Index(vocab).get_indexer(tokens)
+    known = positions >= 0
+
+    bits = np.zeros(len(genre), dtype=np.uint64)
+    np.bitwise_or.at(bits, tokens.index[known], np.left_shift(np.uint64(1), positions[known].astype(np.uint64)))
+    return bits
+
+
+def genre_mask(genres, vocab):
+    """Bitmask with the bits of ``genres`` set."""
+    positions = pd.Index(vocab).get_indexer(list(genres))
+    if (positions < 0).any():
+        unknown = [g for g, p in zip(genres, positions) if p < 0]
+        raise KeyError(f"Unknown genres: {unknown}")
+    return np.bitwise_or.reduce(np.left_shift(np.uint64(1), positions.astype(np.uint64)), initial=np.uint64(0))
+
+
+def any_genre(bits, genres, vocab):
+    """Boolean mask of rows having at least one of ``genres``."""
+    return (np.asarray(bits) & genre_mask(genres, vocab)) != 0
+
+
+def all_genres(bits, genres, vocab):
+    """Boolean mask of rows having every one of ``genres``."""
+    mask = genre_mask(genres, vocab)
+    return (np.asarray(bits) & mask) == mask
+
+
+def multi_hot(bits, vocab, genres=None):
+    """Rows x genres 0/1 matrix (uint8) for ``genres`` (default: all of ``vocab``)."""
+    positions = np.arange(len(vocab)) if genres is None else pd.Index(vocab).get_indexer(list(genres))
+    shifted = np.right_shift(np.asarray(bits)[:, None], positions.astype(np.uint64)[None, :])
+    return (shifted & np.uint64(1)).astype(np.uint8)
+
+
+def genre_counts(bits, vocab):
+    """Number of rows carrying each genre, as a Series indexed by genre."""
+    counts = multi_hot(bits, vocab).sum(axis=0, dtype=np.int64)
+    return pd.Series(counts, index=pd.Index(vocab, name='genre'))
+
+
+def genre_pairs(bits, vocab, genres=None):
+    """Explode-free (row, genre) pairs.
+
+    Returns the row positions and genre names of every set bit, in row
+    order. This is the long form ``DataFrame.explode`` would produce,
+    computed without building Python lists.
+    """
+    names = np.asarray(vocab if genres is None else list(genres), dtype=object)
+    rows, cols = np.nonzero(multi_hot(bits, vocab, genres))
+    return rows, names[cols]
@@ -0,0 +1,77 @@
+"""Growth analytics over a genre x year matrix, for every genre at once.
+
+Each function takes a DataFrame with one row per genre and one column
+per consecutive year (see :func:`genre_year_matrix`); a missing or zero
+value means the genre had no anime that year. Everything is computed
+with array operations across all rows, so ranking the whole genre
+vocabulary costs the same as a handful of genres.
+"""
+import numpy as np
+import pandas as pd
+
+from animelens.olap import anime_cube
+
+
+def genre_year_matrix(year_range, genres=None, cube=None):
+    """Anime per genre (rows) and year (columns) over ``year_range``.
+
+    Every year of the range gets a column; genres default to all genres
+    with at least one anime in the range.
+    """
+    cube = cube or anime_cube()
+    levels = None if genres is None else {'genre': list(genres)}
+    counts = cube.query(['aired_from_year', 'genre'], years=year_range, levels=levels)
+    matrix = counts.pivot(index='genre', columns='aired_from_year', values='count')
+    years = pd.RangeIndex(year_range[0], year_range[1] + 1, name='aired_from_year')
+    return matrix.reindex(columns=years).fillna(0)
+
+
+def rolling_mean(matrix, window):
+    """Trailing ``window``-year mean along each row (shorter at the start)."""
+    values = matrix.to_numpy(dtype='float64')
+    totals = np.cumsum(np.pad(values, ((0, 0), (1, 0))), axis=1)
+    lengths = np.minimum(np.arange(1, values.shape[1] + 1), window)
+    ends = np.arange(1, values.shape[1] + 1)
+    means = (totals[:, ends] - totals[:, ends - lengths]) / lengths
+    return pd.DataFrame(means, index=matrix.index, columns=matrix.columns)
+
+
+def rank_trajectories(matrix):
+    """Rank of each genre within each year (1 = most anime; ties share the best rank)."""
+    return matrix.rank(axis=0, ascending=False, method='min').astype('int64')
+
+
+def growth_summary(matrix):
+    """First and last year with anime, their values, change, CAGR and latest YoY per genre.
+
+    CAGR is NaN for genres with a single year or a zero first value;
+    ``Latest YoY (%)`` compares the last year with the one before it,
+    when that year had anime.
+    """
+    values = matrix.to_numpy(dtype='float64')
+    years = matrix.columns.to_numpy()
+    present = values > 0
+    rows = np.arange(len(values))
+    first = present.argmax(axis=1)
+    last = values.shape[1] - 1 - present[:, ::-1].argmax(axis=1)
+
+    first_value = values[rows, first]
+    last_value = values[rows, last]
+    span = (years[last] - years[first]).astype('float64')
+    previous = values[rows, np.maximum(last - 1, 0)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cagr = np.where((span > 0) & (first_value > 0), ((last_value / first_value) ** (1 / span) - 1) * 100, np.nan)
+        yoy = np.where((last > 0) & (previous > 0), (last_value / previous - 1) * 100, np.nan)
+
+    summary = pd.DataFrame({
+        'Genre': matrix.index,
+        'First Year': years[first],
+        'Last Year': years[last],
+        'Initial Value': first_value,
+        'Final Value': last_value,
+        'Change': last_value - first_value,
+        'CAGR (%)': cagr,
+        'Latest YoY (%)': yoy,
+        'Years': present.sum(axis=1),
+    })
+    return summary[summary['Years'] > 0].reset_index(drop=True)
@@ -0,0 +1,20 @@
+"""Vectorized 64-bit hashing of integer keys for sampling and sketches."""
+import numpy as np
+
+GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def splitmix64(x, seed=0):
+    """splitmix64 finalizer over a uint64 array, offset by ``seed``."""
+    with np.errstate(over='ignore'):
+        x = np.asarray(x, dtype=np.uint64) + np.uint64(seed) * GOLDEN_GAMMA
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def pair_keys(high, low):
+    """Pack two non-negative int32 arrays into one uint64 key per row."""
+    high = np.asarray(high, dtype=np.int64).astype(np.uint64)
+    low = np.asarray(low, dtype=np.int64).astype(np.uint64)
+    return (high << np.uint64(32)) | low
@@ -0,0 +1,203 @@
+"""Parallel, resumable ingest of the raw Kaggle CSVs.
+
+The lists CSV is split into byte ranges aligned to line boundaries. A
+process pool parses the ranges independently and writes each one as a
+Parquet partition under ``data/cache/lists_parts``. A manifest records
+the source file and the ranges, so an interrupted run picks up where it
+stopped: ranges whose partition already exists are skipped. Once every
+partition is present they are concatenated, in order, into the
+memory-mapped store of :mod:`animelens.store`.
+
+The anime catalog is built in a thread while the users dimension and
+the lists are processed. Finally the country-sorted copy of the store
+and the regional sketches of :mod:`animelens.sketches` are built from it.
+
+Run it with::
+
+    python -m animelens.ingest [--workers N] [--chunk-mb MB]
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from animelens.data import CACHE_DIR, LISTS_CSV, USERS_CSV, anime_table, load_anime, write_parquet_atomic
+from animelens.lists import LIST_DTYPES, with_user_ids
+from animelens.sketches import SKETCHES_PATH, build_sketches, save_sketches
+from animelens.store import (
+    COUNTRY_STORE_DIR, LIST_STORE_DIR, SOURCE_COLUMNS, STORE_COLUMNS, build_country_store, encode_chunk,
+    iter_store_chunks, write_list_store,
+)
+from animelens.users import load_users, username_index
+
+PARTS_DIR = CACHE_DIR / "lists_parts"
+
+# ~64 MB of CSV is roughly a million rows per partition
+CHUNK_BYTES = 64 * 1024 * 1024
+
+DROPPED_METADATA_KEY = b'animelens.dropped_rows'
+
+
+def split_byte_ranges(path, chunk_bytes=CHUNK_BYTES):
+    """``(start, end)`` byte ranges of ``path``'s data rows, split on newlines.
+
+    The header line is excluded. Each range ends just after a newline, so
+    no row is cut in two. Rows must not contain quoted newlines, which
+    holds for the lists CSV.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        ranges = []
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_byte_range(path, start, end, columns=SOURCE_COLUMNS):
+    """Parse rows ``[start, end)`` of a CSV, using the file's header line."""
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        data = f.read(end - start)
+    dtypes = {col: LIST_DTYPES[col] for col in columns if col in LIST_DTYPES}
+    return pd.read_csv(io.BytesIO(header + data), usecols=columns, dtype=dtypes)
+
+
+def part_path(parts_dir, index):
+    return Path(parts_dir) / f"part-{index:05d}.parquet"
+
+
+# Set in each worker process by _init_worker
+_usernames = None
+
+
+def _init_worker(usernames):
+    global _usernames
+    _usernames = usernames
+
+
+def ingest_range(path, start, end, out_path):
+    """Encode one byte range of the lists CSV into a Parquet partition."""
+    chunk = next(with_user_ids([read_byte_range(path, start, end)], _usernames))
+    columns, dropped = encode_chunk(chunk)
+    table = pa.table(columns).replace_schema_metadata({DROPPED_METADATA_KEY: str(dropped).encode()})
+    write_parquet_atomic(table, out_path)
+    return len(columns['anime_id'])
+
+
+def _manifest(csv_path, chunk_bytes, ranges):
+    stat = os.stat(csv_path)
+    users = os.stat(USERS_CSV)
+    return {
+        'source': str(csv_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'users_size': users.st_size,
+        'users_mtime': users.st_mtime,
+        'chunk_bytes': chunk_bytes,
+        'ranges': ranges,
+    }
+
+
+def prepare_parts_dir(csv_path, parts_dir=PARTS_DIR, chunk_bytes=CHUNK_BYTES):
+    """Return the byte ranges to ingest, keeping partitions from a matching run.
+
+    Partitions left by a run over a different source file, users file or
+    chunk size are discarded.
+    """
+    parts_dir = Path(parts_dir)
+    manifest_path = parts_dir / "manifest.json"
+    manifest = _manifest(csv_path, chunk_bytes, split_byte_ranges(csv_path, chunk_bytes))
+    # JSON turns the range tuples into lists
+    manifest = json.loads(json.dumps(manifest))
+
+    if manifest_path.exists() and json.loads(manifest_path.read_text()) == manifest:
+        return manifest['ranges']
+
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    parts_dir.mkdir(parents=True)
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return manifest['ranges']
+
+
+def iter_parts(parts_dir, count):
+    """Yield ``({name: array}, dropped_rows)`` from partitions in order."""
+    for i in range(count):
+        table = pq.read_table(part_path(parts_dir, i))
+        dropped = int(table.schema.metadata[DROPPED_METADATA_KEY])
+        yield {col: table.column(col).to_numpy() for col in STORE_COLUMNS}, dropped
+
+
+def ingest_lists(usernames, csv_path=LISTS_CSV, store_dir=LIST_STORE_DIR, parts_dir=PARTS_DIR,
+                 chunk_bytes=CHUNK_BYTES, workers=None, progress=print):
+    """Build the lists store from ``csv_path`` with a pool of processes.
+
+    Safe to interrupt and rerun: finished partitions are kept and only the
+    remaining byte ranges are parsed again.
+    """
+    ranges = prepare_parts_dir(csv_path, parts_dir, chunk_bytes)
+    todo = [i for i in range(len(ranges)) if not part_path(parts_dir, i).exists()]
+    progress(f"{len(ranges) - len(todo)}/{len(ranges)} partitions already ingested")
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(usernames,)) as pool:
+            futures = {
+                pool.submit(ingest_range, str(csv_path), *ranges[i], part_path(parts_dir, i)): i
+                for i in todo
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                rows = future.result()
+                progress(f"[{done}/{len(todo)}] part {futures[future]:05d}: {rows:,} rows")
+
+    store = write_list_store(iter_parts(parts_dir, len(ranges)), store_dir, source=str(csv_path))
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    return store
+
+
+def ingest_all(workers=None, chunk_bytes=CHUNK_BYTES, progress=print):
+    """Build the anime catalog, users dimension, lists stores and sketches."""
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # The catalog does not depend on the other two files
+        catalog = pool.submit(anime_table)
+        usernames = username_index()
+        store = ingest_lists(usernames, chunk_bytes=chunk_bytes, workers=workers, progress=progress)
+        catalog.result()
+
+    users = load_users(['country'])
+    user_country, countries = pd.factorize(users['country'], sort=True)
+    build_country_store(store, user_country, countries)
+    progress(f"Wrote the country-sorted copy to {COUNTRY_STORE_DIR}")
+
+    chunks = iter_store_chunks(store, ['user_id', 'anime_id'])
+    save_sketches(build_sketches(chunks, users, load_anime(['anime_id', 'genre', 'score'])))
+    progress(f"Wrote regional sketches to {SKETCHES_PATH}")
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_BYTES // (1024 * 1024),
+                        help="approximate CSV megabytes per partition")
+    args = parser.parse_args()
+
+    store = ingest_all(workers=args.workers, chunk_bytes=args.chunk_mb * 1024 * 1024)
+    print(f"Wrote {len(store['anime_id']):,} list entries to {LIST_STORE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Out-of-core aggregation of the user anime lists.
+
+``animelists_cleaned.csv`` is several GB, so it is never loaded whole.
+Rows are streamed in fixed-size chunks and folded into per-country and
+per-user aggregates. The peak memory is one chunk plus the aggregates,
+so it does not grow with the size of the lists file.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from animelens.data import LISTS_CSV
+from animelens.sampling import CountryReservoir
+
+LIST_COLUMNS = ['username', 'anime_id', 'my_score', 'my_status']
+LIST_DTYPES = {
+    'username': 'string',
+    'anime_id': 'int32',
+    'my_score': 'int8',
+    'my_status': 'uint8',
+    'my_start_date': 'string',
+    'my_finish_date': 'string',
+}
+
+# ~500k rows keeps a parsed chunk well under 100 MB
+CHUNK_ROWS = 500_000
+
+
+def iter_list_chunks(path=LISTS_CSV, columns=LIST_COLUMNS, chunk_rows=CHUNK_ROWS):
+    """Yield the lists CSV as DataFrames of at most ``chunk_rows`` rows."""
+    dtypes = {col: LIST_DTYPES[col] for col in columns if col in LIST_DTYPES}
+    with pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunk_rows) as reader:
+        yield from reader
+
+
+def with_user_ids(chunks, usernames):
+    """Add a dense ``user_id`` column to CSV chunks; unknown users get -1.
+
+    ``usernames`` is the users dimension's username index, see
+    :func:`animelens.users.username_index`.
+    """
+    for chunk in chunks:
+        chunk['user_id'] = usernames.get_indexer(chunk['username']).astype('int32')
+        yield chunk
+
+
+def genre_indicator(anime):
+    """Sparse anime x genre 0/1 matrix for ``anime`` rows, plus genre names."""
+    genres = anime['genre'].fillna('Unknown').str.split(', ').reset_index(drop=True).explode()
+    codes, names = pd.factorize(genres, sort=True)
+    rows = genres.index.to_numpy()
+    matrix = sparse.csr_matrix((np.ones(len(codes)), (rows, codes)), shape=(len(anime), len(names)))
+    return matrix, pd.Index(names)
+
+
+@dataclass
+class RegionalAggregates:
+    """Per-country totals folded out of the lists file.
+
+    ``country_users`` is the sparse countries x users indicator,
+    ``country_anime`` the countries x anime list entries,
+    ``anime_genres`` the anime x genre indicator, and ``country_genres``
+    their exact product as a dense countries x genres count matrix.
+    ``user_entries`` is the number of list entries per ``user_id``.
+    ``reservoir``, when requested, holds a per-country sample of entries.
+
+    The first ``cataloged`` rows of ``anime`` are the catalog; the rows
+    after them are anime found only in the lists, with genre ``Unknown``
+    and no score.
+    """
+    countries: pd.Index
+    genres: pd.Index
+    anime: pd.DataFrame
+    cataloged: int
+    anime_genres: sparse.csr_matrix
+    user_country: np.ndarray
+    country_users: sparse.csr_matrix
+    country_anime: sparse.csr_matrix
+    country_genres: np.ndarray
+    country_entries: np.ndarray
+    user_entries: np.ndarray
+    reservoir: CountryReservoir = None
+
+    def country_activity(self):
+        """List entries per country, most active first."""
+        activity = pd.Series(self.country_entries, index=self.countries)
+        return activity[activity > 0].sort_values(ascending=False)
+
+    def genre_counts(self, countries=None):
+        """Long-form ``country, genre, count`` table of list entries."""
+        return self._long_genre_counts(self.country_genres, countries)
+
+    def sampled_genre_counts(self, size, countries=None):
+        """Like :meth:`genre_counts`, over at most ``size`` sampled entries per country."""
+        codes = None if countries is None else self.countries.get_indexer(list(countries))
+        country, rows = self.reservoir.sample(size, codes)
+        country_anime = sparse.csr_matrix(
+            (np.ones(len(country), dtype=np.int64), (country, rows['anime_pos'])),
+            shape=self.country_anime.shape,
+        )
+        counts = (country_anime @ self.anime_genres.astype(np.int64)).toarray()
+        return self._long_genre_counts(counts, countries)
+
+    def _long_genre_counts(self, counts, countries):
+        frame = pd.DataFrame(counts, index=self.countries, columns=self.genres)
+        if countries is not None:
+            frame = frame.loc[list(countries)]
+        frame = frame.rename_axis(index='country', columns='genre').stack().reset_index(name='count')
+        return frame[frame['count'] > 0].astype({'count': 'int64'})
+
+    def country_summary(self, country):
+        """Distinct users and distinct anime with list entries in ``country``."""
+        row = self.countries.get_loc(country)
+        users = self.country_users[row].indices
+        users_count = int(np.count_nonzero(self.user_entries[users]))
+        anime_count = int(self.country_anime[row].nnz)
+        return users_count, anime_count
+
+    def genre_scores(self, country):
+        """Entry-weighted mean catalog score per genre for ``country``."""
+        row = self.countries.get_loc(country)
+        entries = self.country_anime[row].toarray().ravel()
+        # Only catalog anime have a score to average, as in an inner merge with the catalog
+        entries[self.cataloged:] = 0
+        score = self.anime['score'].to_numpy(dtype='float64')
+        scored = np.where(np.isnan(score), 0, entries)
+
+        count = self.anime_genres.T @ entries
+        weight = self.anime_genres.T @ scored
+        total = self.anime_genres.T @ (scored * np.nan_to_num(score))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_score = total / weight
+        frame = pd.DataFrame({'genre': self.genres, 'avg_score': avg_score, 'count': count})
+        return frame[frame['count'] > 0].reset_index(drop=True)
+
+
+def aggregate_lists(chunks, users, anime, reservoir=None):
+    """Fold list chunks into a :class:`RegionalAggregates`.
+
+    Each chunk maps column names to arrays and needs a dense ``user_id``
+    and an ``anime_id``. ``users`` is the users dimension, where row
+    ``i`` describes ``user_id == i``, and ``anime`` needs ``anime_id``,
+    ``genre`` and ``score``. Rows with an unknown user (``user_id == -1``)
+    have no country and are skipped. Anime missing from the catalog are
+    appended to ``anime`` as they are met, so their entries still count
+    under genre ``Unknown`` and towards each country's distinct anime.
+
+    The country x genre counts are the sparse product
+    ``(country x user) @ (user x anime) @ (anime x genre)``. The user x
+    anime matrix is only ever built for one chunk at a time, and each
+    chunk's ``country_users @ user_anime`` is added to the running
+    country x anime total, so memory does not grow with the lists file.
+
+    Pass a :class:`~animelens.sampling.CountryReservoir` to also sample
+    entries per country in the same pass.
+    """
+    anime = anime.drop_duplicates('anime_id').reset_index(drop=True)
+    user_country, countries = pd.factorize(users['country'], sort=True)
+
+    anime_index = pd.Index(anime['anime_id'])
+
+    country_users = sparse.csr_matrix(
+        (np.ones(len(users), dtype=np.int64), (user_country, np.arange(len(users)))),
+        shape=(len(countries), len(users)),
+    )
+    country_anime = sparse.csr_matrix((len(countries), len(anime_index)), dtype=np.int64)
+    country_entries = np.zeros(len(countries), dtype=np.int64)
+    user_entries = np.zeros(len(users), dtype=np.int64)
+
+    for chunk in chunks:
+        user_id = np.asarray(chunk['user_id'])
+        known = user_id >= 0
+        user_id = user_id[known]
+        anime_id = np.asarray(chunk['anime_id'])[known]
+        anime_pos = anime_index.get_indexer(anime_id)
+
+        # Give anime missing from the catalog the next free positions
+        missing = anime_pos < 0
+        if missing.any():
+            anime_index = anime_index.append(pd.Index(np.unique(anime_id[missing])))
+            anime_pos[missing] = anime_index.get_indexer(anime_id[missing])
+            country_anime.resize((len(countries), len(anime_index)))
+
+        country = user_country[user_id]
+        user_entries += np.bincount(user_id, minlength=len(users))
+        country_entries += np.bincount(country, minlength=len(countries))
+
+        user_anime = sparse.csr_matrix(
+            (np.ones(len(user_id), dtype=np.int64), (user_id, anime_pos)),
+            shape=(len(users), len(anime_index)),
+        )
+        country_anime += country_users @ user_anime
+
+        if reservoir is not None:
+            reservoir.update(country, user_id, anime_id=anime_id, anime_pos=anime_pos)
+
+    cataloged = len(anime)
+    extra = anime_index[cataloged:]
+    if len(extra):
+        anime = pd.concat([anime, pd.DataFrame({'anime_id': extra})], ignore_index=True)
+    anime_genres, genres = genre_indicator(anime)
+    country_genres = (country_anime @ anime_genres.astype(np.int64)).toarray()
+    return RegionalAggregates(
+        countries=pd.Index(countries),
+        genres=genres,
+        anime=anime,
+        cataloged=cataloged,
+        anime_genres=anime_genres,
+        user_country=user_country,
+        country_users=country_users,
+        country_anime=country_anime,
+        country_genres=country_genres,
+        country_entries=country_entries,
+        user_entries=user_entries,
+        reservoir=reservoir,
+    )
@@ -0,0 +1,204 @@
+"""Success-prediction model of page 6 and its on-disk registry.
+
+:func:`train_model` returns a :class:`TrainedModel`. It holds the fitted
+forest, its feature columns and everything the page plots from the
+held-out split, so a rerun never preprocesses the catalog or fits a
+tree. Models are stored with joblib under ``data/cache/models``. Each is
+keyed by a hash of the source columns it is trained on, the
+hyperparameters and :data:`MODEL_VERSION`. A server restart then loads
+the stored model in milliseconds, and a changed catalog or config trains
+a new one (see :mod:`animelens.training`).
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+from animelens.data import CACHE_DIR, load_anime
+
+MODEL_DIR = CACHE_DIR / "models"
+
+# Bump whenever preprocessing or the stored artifacts change
+MODEL_VERSION = 2
+
+# Catalog columns the features are built from
+SOURCE_COLUMNS = ['score', 'episodes', 'duration_min', 'aired_from_year', 'members', 'favorites', 'genre', 'studio']
+BASE_FEATURES = ['episodes', 'duration_min', 'aired_from_year', 'log_members', 'fav_member_ratio']
+
+SUCCESS_SCORE = 7
+THRESHOLD = 0.6
+TOP_STUDIOS = 20
+
+MODEL_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 10,
+    'min_samples_split': 10,
+    'random_state': 42,
+}
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+CV_FOLDS = 5
+
+# Trees added per warm-start step when fitting with progress reporting
+TREES_PER_STEP = 10
+
+
+def preprocess_data(df):
+    """Feature matrix and success labels for catalog rows ``df``."""
+    df = df.copy()
+
+    # Define success threshold
+    df['successful'] = df['score'] >= SUCCESS_SCORE
+
+    # Handle missing values
+    df['episodes'] = pd.to_numeric(df['episodes'], errors='coerce').fillna(0)
+    df['duration_min'] = pd.to_numeric(df['duration_min'], errors='coerce').fillna(0)
+    df['aired_from_year'] = pd.to_numeric(df['aired_from_year'], errors='coerce').fillna(2000)
+    df['members'] = pd.to_numeric(df['members'], errors='coerce').fillna(0)
+
+    # Create log transformations for skewed features
+    df['log_members'] = np.log1p(df['members'])
+
+    # Genre encoding
+    df['genre'] = df['genre'].fillna('Unknown').astype(str).str.split(', ')
+    genres_dummies = df['genre'].explode().str.get_dummies().groupby(level=0).sum()
+
+    # Studio encoding (only top studios)
+    df['studio'] = df['studio'].fillna('Unknown')
+    top_studios = df['studio'].value_counts().nlargest(TOP_STUDIOS).index
+    df['studio'] = df['studio'].where(df['studio'].isin(top_studios), 'Other')
+    studio_dummies = pd.get_dummies(df['studio'], prefix='studio')
+
+    # Feature creation
+    if 'favorites' in df.columns:
+        df['fav_member_ratio'] = df['favorites'] / df['members']
+
+    # Combine all features
+    base_features = df[[col for col in BASE_FEATURES if col in df.columns]]
+    features = pd.concat([base_features, genres_dummies, studio_dummies], axis=1)
+
+    # Handle any remaining NaN values
+    features = features.fillna(0)
+
+    return features, df['successful']
+
+
+def fit_forest(X, y, params=MODEL_PARAMS, progress=None):
+    """Fit a forest, reporting ``progress('trees', fitted, total)`` as trees are added.
+
+    Without ``progress`` this is a plain fit. With it, the forest grows
+    :data:`TREES_PER_STEP` trees at a time with ``warm_start``, which
+    draws the same trees as a single fit.
+    """
+    if progress is None:
+        return RandomForestClassifier(**params).fit(X, y)
+    total = params.get('n_estimators', 100)
+    clf = RandomForestClassifier(**{**params, 'warm_start': True})
+    for step in range(TREES_PER_STEP, total + TREES_PER_STEP, TREES_PER_STEP):
+        fitted = min(step, total)
+        clf.set_params(n_estimators=fitted).fit(X, y)
+        progress('trees', fitted, total)
+    return clf.set_params(warm_start=False)
+
+
+def build_model(X_train, X_test, y_train, y_test, params=MODEL_PARAMS, progress=None):
+    """Fit the forest and score the held-out rows at :data:`THRESHOLD`."""
+    clf = fit_forest(X_train, y_train, params, progress)
+
+    y_proba = clf.predict_proba(X_test)[:, 1]
+    y_pred = (y_proba >= THRESHOLD).astype(int)
+
+    return clf, y_pred, y_proba
+
+
+@dataclass
+class TrainedModel:
+    """A fitted model with its feature schema and held-out results."""
+    key: str
+    params: dict
+    clf: RandomForestClassifier
+    feature_columns: list
+    y_test: np.ndarray
+    y_pred: np.ndarray
+    y_proba: np.ndarray
+    success_corr: pd.Series  # correlation of each feature with success, descending
+
+
+def data_hash(df):
+    """Content hash of the :data:`SOURCE_COLUMNS` of ``df``."""
+    rows = pd.util.hash_pandas_object(df[SOURCE_COLUMNS], index=False)
+    return hashlib.sha256(rows.to_numpy().tobytes()).hexdigest()
+
+
+def model_key(df, params=MODEL_PARAMS):
+    """Registry key for a model trained on ``df`` with ``params``."""
+    config = {
+        'version': MODEL_VERSION,
+        'params': params,
+        'success_score': SUCCESS_SCORE,
+        'threshold': THRESHOLD,
+        'top_studios': TOP_STUDIOS,
+        'test_size': TEST_SIZE,
+        'split_seed': SPLIT_SEED,
+        'data': data_hash(df),
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def model_path(key):
+    return MODEL_DIR / f"{key}.joblib"
+
+
+def train_model(features, labels, params=MODEL_PARAMS, key=None, progress=None):
+    """Fit a model on a held-out split of ``features`` (see :func:`preprocess_data`).
+
+    ``progress('trees', fitted, total)`` is called as trees are fitted.
+    """
+    X_train, X_test, y_train, y_test = train_test_split(features, labels, test_size=TEST_SIZE,
+                                                        random_state=SPLIT_SEED)
+    clf, y_pred, y_proba = build_model(X_train, X_test, y_train, y_test, params, progress)
+
+    corr = pd.concat([features, labels], axis=1).corr()['successful']
+    return TrainedModel(
+        key=key,
+        params=dict(params),
+        clf=clf,
+        feature_columns=list(features.columns),
+        y_test=y_test.to_numpy(),
+        y_pred=y_pred,
+        y_proba=y_proba,
+        success_corr=corr.sort_values(ascending=False).drop('successful'),
+    )
+
+
+def save_model(model):
+    """Write ``model`` to the registry, renaming it into place."""
+    path = model_path(model.key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    joblib.dump(model, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def load_model(key):
+    """The registry's model for ``key``, or None if it has not been trained."""
+    path = model_path(key)
+    return joblib.load(path) if path.exists() else None
+
+
+def latest_key():
+    """Key of the most recently saved model, or None if the registry is empty."""
+    paths = list(MODEL_DIR.glob("*.joblib"))
+    return max(paths, key=lambda path: path.stat().st_mtime).stem if paths else None
+
+
+def current_key(params=MODEL_PARAMS):
+    """Registry key of the model for the current catalog."""
+    return model_key(load_anime(SOURCE_COLUMNS), params)
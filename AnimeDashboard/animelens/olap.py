@@ -0,0 +1,270 @@
+"""Prefix-sum OLAP cube over anime-level metrics.
+
+A :class:`Cube` answers "measure X aggregated by dimensions D over year
+range R with filters F" without going back to the anime rows. Its cells
+are the distinct combinations of the categorical dimensions
+(:data:`DIMENSIONS`: season, type, source, rating, episode bucket and the
+genre set). Each cell keeps, for every year it has anime in, the anime
+count and the non-null count, sum and sum of squares of each measure,
+along with their running totals over the years. The total of a cell over
+a year range is then the difference of two running totals found by
+binary search, whatever the width of the range.
+
+The genre dimension holds each anime's set of genres (``genre_bits``), so
+genre filters are exact bitmask tests. Grouping by ``'genre'`` counts an
+anime once for each of its genres.
+
+:meth:`Cube.query` returns a DataFrame like the ``groupby`` it replaces,
+with means and standard deviations derived from the stored sums.
+Minimum and maximum (``extrema``) are not additive; they are reduced over
+the cell's yearly entries instead.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from animelens.data import catalog_genres, load_anime
+from animelens.genres import all_genres, any_genre, multi_hot
+from animelens.queries import EPISODE_BINS, EPISODE_LABELS
+
+DIMENSIONS = ['season', 'type', 'source', 'rating', 'episode_bucket', 'genre']
+MEASURES = ['score', 'popularity', 'members', 'favorites', 'episodes']
+
+UNKNOWN = 'Unknown'
+
+
+def dimension_labels(df, dim):
+    """Label of every row of ``df`` along ``dim``; missing values are ``Unknown``."""
+    if dim == 'season' and 'season' not in df.columns:
+        labels = df['premiered'].str.split(' ').str[0]
+    elif dim == 'episode_bucket':
+        labels = pd.cut(df['episodes'], bins=EPISODE_BINS, labels=EPISODE_LABELS).astype(object)
+    else:
+        labels = df[dim].astype(object)
+    return labels.where(labels.notna(), UNKNOWN).astype(str)
+
+
+@dataclass
+class Cube:
+    """Yearly entries of each cell, sorted by ``(cell, year)``, with running totals."""
+    year: str                # name of the year column, used as a ``by`` key
+    dims: list
+    levels: dict             # dim -> pd.Index of labels (not for 'genre')
+    codes: dict              # dim -> per-cell code into levels[dim]
+    genre_bits: np.ndarray   # per-cell genre set
+    vocab: list
+    columns: list            # additive columns: count, then {m}_n, {m}_sum, {m}_sumsq
+    measures: list
+    cell: np.ndarray         # per-entry cell
+    years: np.ndarray        # per-entry year
+    keys: np.ndarray         # per-entry search key, increasing with (cell, year)
+    values: np.ndarray       # per-entry sums, entries x columns
+    prefix: np.ndarray       # running totals of ``values`` within each cell
+    extrema: dict            # measure -> (per-entry min, per-entry max)
+
+    @property
+    def first_year(self):
+        return int(self.years.min()) if len(self.years) else 0
+
+    @property
+    def last_year(self):
+        return int(self.years.max()) if len(self.years) else 0
+
+    def _cell_mask(self, where, match_all):
+        mask = np.ones(len(self.genre_bits), dtype=bool)
+        for dim, values in (where or {}).items():
+            if dim == 'genre':
+                if values:
+                    match = all_genres if match_all else any_genre
+                    mask &= match(self.genre_bits, list(values), self.vocab)
+            else:
+                mask &= np.isin(self.codes[dim], self.levels[dim].get_indexer(list(values)))
+        return mask
+
+    def _range_totals(self, cells, years):
+        """Per-cell totals over ``years`` (inclusive), from two running totals each."""
+        first, last = self.first_year, self.last_year
+        lo, hi = (first, last) if years is None else (max(years[0], first), min(years[1], last))
+        if lo > hi:
+            return np.zeros((len(cells), len(self.columns)))
+        span = last - first + 2
+        # Last entry of the cell up to year lo - 1, and up to year hi
+        before = np.searchsorted(self.keys, cells * span + (lo - first), side='right') - 1
+        end = np.searchsorted(self.keys, cells * span + (hi - first + 1), side='right') - 1
+
+        def running(entry):
+            valid = (entry >= 0) & (self.cell[np.maximum(entry, 0)] == cells)
+            return np.where(valid[:, None], self.prefix[np.maximum(entry, 0)], 0)
+
+        return running(end) - running(before)
+
+    def _group(self, cell, year, by, levels):
+        """Flat group keys for rows of ``cell`` (and ``year``), expanding genres.
+
+        Returns ``(rows, flat, sizes, names)``: the row behind each
+        grouped row, its raveled key, and the size and labels of each
+        ``by`` key (``None`` labels for the year).
+        """
+        levels = levels or {}
+        rows = np.arange(len(cell))
+        if 'genre' in by:
+            genre_names = np.asarray(self.vocab if levels.get('genre') is None else list(levels['genre']), dtype=object)
+            rows, genre_codes = np.nonzero(multi_hot(self.genre_bits[cell], self.vocab, genre_names))
+        keep = np.ones(len(rows), dtype=bool)
+        for dim in by:
+            if dim not in (self.year, 'genre') and levels.get(dim) is not None:
+                keep &= np.isin(self.codes[dim][cell[rows]], self.levels[dim].get_indexer(list(levels[dim])))
+        rows = rows[keep]
+
+        parts, names = [], []
+        for dim in by:
+            if dim == self.year:
+                parts.append(year[rows] - self.first_year)
+                names.append(None)
+            elif dim == 'genre':
+                parts.append(genre_codes[keep])
+                names.append(genre_names)
+            else:
+                parts.append(self.codes[dim][cell[rows]])
+                names.append(np.asarray(self.levels[dim], dtype=object))
+        sizes = [self.last_year - self.first_year + 1 if n is None else len(n) for n in names]
+        if not parts:
+            return rows, np.zeros(len(rows), dtype=np.int64), sizes, names
+        flat = np.ravel_multi_index([np.asarray(p, dtype=np.int64) for p in parts], sizes)
+        return rows, flat, sizes, names
+
+    def query(self, by=(), years=None, where=None, match_all=False, levels=None):
+        """Aggregate the cube, like ``groupby(by)`` on the filtered anime.
+
+        ``by`` holds dimensions and/or the year column; ``years`` is an
+        inclusive ``(first, last)`` range; ``where`` maps dimensions to
+        the labels to keep (for ``'genre'``, any or all of them, per
+        ``match_all``); ``levels`` limits which labels of a ``by``
+        dimension are returned. The result has one row per non-empty
+        group, with ``count`` and, per measure, ``{m}`` (mean),
+        ``{m}_std``, ``{m}_sum`` and ``{m}_n``, plus ``{m}_min`` and
+        ``{m}_max`` for the cube's extrema.
+        """
+        by = list(by)
+        cells = np.flatnonzero(self._cell_mask(where, match_all))
+
+        # Yearly entries in the window are needed when grouping by year, and for extrema
+        if self.year in by or self.extrema:
+            window = np.isin(self.cell, cells)
+            if years is not None:
+                window &= (self.years >= years[0]) & (self.years <= years[1])
+            entries = np.flatnonzero(window)
+
+        if self.year in by:
+            rows, flat, sizes, names = self._group(self.cell[entries], self.years[entries], by, levels)
+            data = self.values[entries[rows]]
+        else:
+            rows, flat, sizes, names = self._group(cells, None, by, levels)
+            data = self._range_totals(cells, years)[rows]
+
+        gid, uniques = pd.factorize(flat, sort=True)
+        n_groups = len(uniques)
+        sums = np.column_stack([np.bincount(gid, weights=data[:, j], minlength=n_groups)
+                                for j in range(len(self.columns))])
+        codes = np.unravel_index(uniques, sizes) if by else ()
+        out = pd.DataFrame({
+            dim: c + self.first_year if labels is None else labels[c]
+            for dim, c, labels in zip(by, codes, names)
+        }, index=pd.RangeIndex(n_groups))
+        out['count'] = sums[:, 0].astype(np.int64)
+        for m in self.measures:
+            n, total, sumsq = (sums[:, self.columns.index(f'{m}_{stat}')] for stat in ('n', 'sum', 'sumsq'))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = total / n
+                var = (sumsq - total * mean) / (n - 1)
+            out[m] = np.where(n > 0, mean, np.nan)
+            out[f'{m}_std'] = np.sqrt(np.where(n > 1, np.maximum(var, 0), np.nan))
+            out[f'{m}_sum'] = total
+            out[f'{m}_n'] = n.astype(np.int64)
+
+        if self.extrema:
+            # Reduce the window's entries into the same groups
+            if self.year in by:
+                ext_rows, ext_gid = entries[rows], gid
+            else:
+                ext_rows, ext_flat, _, _ = self._group(self.cell[entries], None, by, levels)
+                ext_gid = np.searchsorted(uniques, ext_flat)
+                ext_rows = entries[ext_rows]
+            for m, (low, high) in self.extrema.items():
+                out[f'{m}_min'] = _reduce(np.fmin, ext_gid, low[ext_rows], n_groups, np.inf)
+                out[f'{m}_max'] = _reduce(np.fmax, ext_gid, high[ext_rows], n_groups, -np.inf)
+
+        return out[out['count'] > 0].reset_index(drop=True)
+
+
+def _reduce(ufunc, gid, values, n_groups, identity):
+    result = np.full(n_groups, identity)
+    ufunc.at(result, gid, values)
+    return np.where(np.isinf(result), np.nan, result)
+
+
+def build_cube(df, dims=DIMENSIONS, measures=MEASURES, year='aired_from_year', extrema=()):
+    """Aggregate anime rows ``df`` into a :class:`Cube`.
+
+    Rows without a ``year`` are left out. ``extrema`` lists measures
+    whose per-group min and max queries should also return.
+    """
+    df = df[df[year].notna()]
+    vocab = catalog_genres()
+
+    levels, row_codes = {}, {}
+    for dim in dims:
+        if dim != 'genre':
+            row_codes[dim], levels[dim] = pd.factorize(dimension_labels(df, dim), sort=True)
+    bits = df['genre_bits'].to_numpy(dtype=np.uint64) if 'genre' in dims else np.zeros(len(df), dtype=np.uint64)
+
+    # Cells are the distinct dimension combinations
+    cell_keys = pd.DataFrame({**row_codes, 'genre_bits': bits})
+    row_cell = cell_keys.groupby(list(cell_keys.columns), sort=True).ngroup().to_numpy()
+    first = pd.Series(np.arange(len(df))).groupby(row_cell).first().to_numpy()
+
+    columns = ['count'] + [f'{m}_{stat}' for m in measures for stat in ('n', 'sum', 'sumsq')]
+    rows = {'cell': row_cell, 'year': df[year].to_numpy().astype(np.int64), 'count': np.ones(len(df))}
+    for m in measures:
+        x = df[m].to_numpy(dtype='float64')
+        known = ~np.isnan(x)
+        rows[f'{m}_n'] = known.astype('float64')
+        rows[f'{m}_sum'] = np.where(known, x, 0)
+        rows[f'{m}_sumsq'] = np.where(known, x * x, 0)
+    for m in extrema:
+        rows[f'{m}_min'] = rows[f'{m}_max'] = df[m].to_numpy(dtype='float64')
+
+    groups = pd.DataFrame(rows).groupby(['cell', 'year'], sort=True)
+    entries = groups[columns].sum()
+    values = entries.to_numpy()
+    cell = entries.index.get_level_values('cell').to_numpy()
+    years = entries.index.get_level_values('year').to_numpy()
+    # Key of (cell, year) is cell * span + year offset; offset 0 stands for "before the first year"
+    span = int(years.max() - years.min()) + 2 if len(years) else 2
+    keys = cell * span + (years - (years.min() if len(years) else 0) + 1)
+    prefix = pd.DataFrame(values).groupby(cell).cumsum().to_numpy()
+
+    return Cube(
+        year=year,
+        dims=list(dims),
+        levels={dim: pd.Index(labels) for dim, labels in levels.items()},
+        codes={dim: codes[first] for dim, codes in row_codes.items()},
+        genre_bits=bits[first],
+        vocab=vocab,
+        columns=columns,
+        measures=list(measures),
+        cell=cell,
+        years=years,
+        keys=keys,
+        values=values,
+        prefix=prefix,
+        extrema={m: (groups[f'{m}_min'].min().to_numpy(), groups[f'{m}_max'].max().to_numpy()) for m in extrema},
+    )
+
+
+@lru_cache(maxsize=None)
+def anime_cube():
+    """Cube of the whole catalog by ``aired_from_year``, built once per process."""
+    return build_cube(load_anime())
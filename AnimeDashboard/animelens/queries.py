@@ -0,0 +1,261 @@
+"""Anime-catalog queries behind one interface, with pandas or Polars execution.
+
+Each function runs one of the filter -> group -> aggregate chains of
+pages 2-4 and returns a pandas DataFrame, whichever backend runs it:
+
+* ``"pandas"`` executes the chain eagerly on the shared catalog table.
+* ``"polars"`` builds the chain as a single LazyFrame plan over the
+  catalog Parquet file. Polars pushes the column projection and the
+  filters down into the Parquet scan, skips intermediate copies, and runs
+  the plan on all cores.
+
+The default comes from ``ANIMELENS_QUERY_BACKEND``. Benchmark both with::
+
+    python -m animelens.queries
+"""
+import time
+
+import pandas as pd
+
+from animelens.data import ANIME_PARQUET, QUERY_BACKEND, anime_table, catalog_genres, load_anime
+from animelens.genres import all_genres, any_genre, genre_mask
+
+try:
+    import polars as pl
+except ImportError:  # the Polars backend is optional
+    pl = None
+
+BACKENDS = ['pandas', 'polars']
+BACKEND_LABELS = {'pandas': 'pandas', 'polars': 'Polars'}
+
+SEASONS = ['Winter', 'Spring', 'Summer', 'Fall']
+
+EPISODE_BINS = [0, 1, 12, 24, 50, 100, float('inf')]
+EPISODE_LABELS = ['Movie/Special', 'Short (1-12)', 'Medium (13-24)', 'Long (25-50)', 'Very Long (51-100)', 'Ultra (>100)']
+
+
+def _backend(backend):
+    backend = (backend or QUERY_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown query backend {backend!r}; expected one of {BACKENDS}")
+    if backend == 'polars' and pl is None:
+        raise ImportError("The polars backend needs the polars package")
+    return backend
+
+
+def backend_selector():
+    """Sidebar radio for the query backend of a page, defaulting to ``ANIMELENS_QUERY_BACKEND``."""
+    import streamlit as st  # only the pages need it, not the benchmark
+
+    label = st.sidebar.radio(
+        "Query backend",
+        list(BACKEND_LABELS.values()),
+        index=BACKENDS.index(QUERY_BACKEND) if QUERY_BACKEND in BACKENDS else 0,
+        help="Default set by the ANIMELENS_QUERY_BACKEND environment variable"
+    )
+    return label.lower()
+
+
+def _scan():
+    anime_table()  # rebuilds the Parquet file if it is missing or stale
+    return pl.scan_parquet(ANIME_PARQUET)
+
+
+def _genre_filter(genres, match_all):
+    """Polars predicate equivalent of :func:`any_genre` / :func:`all_genres`."""
+    mask = pl.lit(int(genre_mask(genres, catalog_genres())), dtype=pl.UInt64)
+    bits = pl.col('genre_bits') & mask
+    return bits == mask if match_all else bits != 0
+
+
+def seasonal_anime(year_range=None, seasons=SEASONS, genres=(), match_all=False, backend=None):
+    """Anime with a ``premiered`` season, filtered as on page 2.
+
+    Adds ``season``, ``season_year`` and ``season_order`` columns.
+    """
+    if _backend(backend) == 'polars':
+        return _polars_seasonal(year_range, seasons, genres, match_all).collect().to_pandas()
+
+    df = load_anime().dropna(subset=['premiered'])
+    df[['season', 'season_year']] = df['premiered'].str.split(' ', expand=True)
+    df = df.dropna(subset=['season_year', 'season'])
+    df['season_year'] = df['season_year'].astype(int)
+    season_order = {season: i for i, season in enumerate(SEASONS)}
+    df = df[df['season'].isin(season_order.keys())]
+    df['season_order'] = df['season'].map(season_order)
+
+    if genres:
+        match = all_genres if match_all else any_genre
+        df = df[match(df['genre_bits'], list(genres), catalog_genres())]
+    if year_range is not None:
+        df = df[(df['season_year'] >= year_range[0]) & (df['season_year'] <= year_range[1])]
+    return df[df['season'].isin(list(seasons))]
+
+
+def seasonal_summary(year_range, seasons=SEASONS, genres=(), match_all=False, backend=None):
+    """Per-season aggregates for page 2, as ``(trend, stats)``.
+
+    ``trend`` has one row per ``(season_year, season)`` with the number of
+    titles and mean score and popularity; ``stats`` has the same per
+    season over the whole period.
+    """
+    if _backend(backend) == 'polars':
+        base = _polars_seasonal(year_range, seasons, genres, match_all, ['title', 'score', 'popularity'])
+        trend = (
+            base.group_by(['season_year', 'season', 'season_order'])
+            .agg(anime_count=pl.col('title').count(), score=pl.col('score').mean(),
+                 popularity=pl.col('popularity').mean())
+            .sort(['season_year', 'season_order'])
+        )
+        stats = (
+            base.group_by('season')
+            .agg(avg_score=pl.col('score').mean(), avg_popularity=pl.col('popularity').mean(),
+                 total_anime=pl.col('title').count())
+            .sort('season')
+        )
+        trend, stats = pl.collect_all([trend, stats])
+        return trend.to_pandas(), stats.to_pandas()
+
+    df = seasonal_anime(year_range, seasons, genres, match_all, backend='pandas')
+    trend = (
+        df.groupby(['season_year', 'season', 'season_order'])
+        .agg(anime_count=('title', 'count'), score=('score', 'mean'), popularity=('popularity', 'mean'))
+        .reset_index()
+        .sort_values(['season_year', 'season_order'])
+        .reset_index(drop=True)
+    )
+    stats = df.groupby('season').agg(
+        avg_score=('score', 'mean'),
+        avg_popularity=('popularity', 'mean'),
+        total_anime=('title', 'count')
+    ).reset_index()
+    return trend, stats
+
+
+def _polars_seasonal(year_range, seasons, genres, match_all, columns=None):
+    season_order = {season: i for i, season in enumerate(SEASONS)}
+    season_parts = pl.col('premiered').str.split(' ')
+    lf = _scan()
+    if columns is not None:
+        lf = lf.select(*columns, 'premiered', 'genre_bits')
+    lf = (
+        lf.drop_nulls('premiered')
+        .with_columns(
+            season=season_parts.list.get(0, null_on_oob=True),
+            season_year=season_parts.list.get(1, null_on_oob=True).cast(pl.Int64, strict=False),
+        )
+        .drop_nulls(['season', 'season_year'])
+        .filter(pl.col('season').is_in(list(seasons)))
+        .with_columns(season_order=pl.col('season').replace_strict(season_order, return_dtype=pl.Int64))
+    )
+    if year_range is not None:
+        lf = lf.filter(pl.col('season_year').is_between(*year_range))
+    if genres:
+        lf = lf.filter(_genre_filter(genres, match_all))
+    return lf
+
+
+def studio_genre_counts(backend=None):
+    """Anime per ``(genre, studio)`` pair (page 3)."""
+    if _backend(backend) == 'polars':
+        lf = (
+            _scan()
+            .select('studio', 'genre')
+            .drop_nulls(['studio', 'genre'])
+            .with_columns(genre=pl.col('genre').str.split(','), studio=pl.col('studio').str.strip_chars())
+            .explode('genre')
+            .with_columns(pl.col('genre').str.strip_chars())
+            .group_by(['genre', 'studio'])
+            .len(name='count')
+            .sort(['genre', 'studio'])
+        )
+        return lf.collect().to_pandas().astype({'count': 'int64'})
+
+    df = load_anime(['studio', 'genre']).dropna()
+    df['genre'] = df['genre'].str.split(',')
+    df = df.explode('genre')
+    df['genre'] = df['genre'].str.strip()
+    df['studio'] = df['studio'].str.strip()
+    return df.groupby(['genre', 'studio']).size().reset_index(name='count')
+
+
+def episode_anime(year_range=None, genres=(), match_all=False, types=(), backend=None):
+    """Anime with at least one episode, filtered as on page 4.
+
+    Adds the ``episode_category`` column.
+    """
+    if _backend(backend) == 'polars':
+        df = _polars_episodes(year_range, genres, match_all, types).collect().to_pandas()
+    else:
+        df = load_anime()
+        df = df[df['episodes'] > 0]
+        if year_range is not None:
+            df = df[(df['aired_from_year'] >= year_range[0]) & (df['aired_from_year'] <= year_range[1])]
+        if genres:
+            match = all_genres if match_all else any_genre
+            df = df[match(df['genre_bits'], list(genres), catalog_genres())]
+        if types:
+            df = df[df['type'].isin(list(types))]
+    df['episode_category'] = pd.cut(df['episodes'], bins=EPISODE_BINS, labels=EPISODE_LABELS)
+    return df
+
+
+def _polars_episodes(year_range, genres, match_all, types):
+    lf = _scan().filter(pl.col('episodes') > 0)
+    if year_range is not None:
+        lf = lf.filter(pl.col('aired_from_year').is_between(*year_range))
+    if genres:
+        lf = lf.filter(_genre_filter(genres, match_all))
+    if types:
+        lf = lf.filter(pl.col('type').is_in(list(types)))
+    return lf
+
+
+def yearly_episode_stats(year_range=None, genres=(), match_all=False, types=(), backend=None):
+    """Mean and median episodes and anime count per ``aired_from_year`` (page 4)."""
+    if _backend(backend) == 'polars':
+        lf = (
+            _polars_episodes(year_range, genres, match_all, types)
+            .drop_nulls('aired_from_year')
+            .group_by('aired_from_year')
+            .agg(avg_episodes=pl.col('episodes').mean(), median_episodes=pl.col('episodes').median(),
+                 anime_count=pl.col('episodes').count())
+            .sort('aired_from_year')
+        )
+        return lf.collect().to_pandas().astype({'anime_count': 'int64'})
+
+    df = episode_anime(year_range, genres, match_all, types, backend='pandas')
+    return df.groupby('aired_from_year').agg(
+        avg_episodes=('episodes', 'mean'),
+        median_episodes=('episodes', 'median'),
+        anime_count=('episodes', 'count')
+    ).reset_index()
+
+
+def benchmark(repeat=5):
+    """Best-of-``repeat`` seconds per query and backend, as a DataFrame."""
+    years = (1980, 2018)
+    genres = ['Action']
+    queries = {
+        'seasonal_anime': lambda b: seasonal_anime(years, genres=genres, backend=b),
+        'seasonal_summary': lambda b: seasonal_summary(years, genres=genres, backend=b),
+        'studio_genre_counts': lambda b: studio_genre_counts(backend=b),
+        'episode_anime': lambda b: episode_anime(years, genres=genres, backend=b),
+        'yearly_episode_stats': lambda b: yearly_episode_stats(years, genres=genres, backend=b),
+    }
+    backends = [b for b in BACKENDS if b != 'polars' or pl is not None]
+    timings = {}
+    for name, query in queries.items():
+        for backend in backends:
+            query(backend)  # warm caches
+            runs = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                query(backend)
+                runs.append(time.perf_counter() - start)
+            timings[(name, backend)] = min(runs)
+    return pd.Series(timings).unstack()
+
+
+if __name__ == "__main__":
+    print((benchmark() * 1000).round(2).to_string(float_format='{:.2f} ms'.format))
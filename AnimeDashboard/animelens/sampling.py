@@ -0,0 +1,77 @@
+"""One-pass, per-country reservoir sampling of list entries.
+
+Every row gets a pseudo-random priority computed by hashing its
+``(user_id, anime_id)`` key with a seed, and each country keeps the
+``capacity`` rows with the smallest priorities (bottom-k sampling). The
+rows of a country, ordered by priority, are a uniform sample of that
+country, and so is any prefix of them: a sample of ``m`` rows is the
+first ``m`` rows of the reservoir. Changing the sample size is a mask,
+not a resample.
+
+Priorities depend only on the row and the seed, so the sample is the
+same whether the lists are streamed from the CSV or the store and
+whatever the chunk size. Memory is bounded by ``capacity`` rows per
+country plus one chunk.
+"""
+import numpy as np
+
+from animelens.hashing import pair_keys, splitmix64
+
+# Upper bound on the per-country sample size offered by the pages
+SAMPLE_CAPACITY = 10_000
+
+
+def row_priorities(user_id, anime_id, seed=42):
+    """uint64 priorities for list rows, from a splitmix64 hash of the key."""
+    return splitmix64(pair_keys(user_id, anime_id), seed)
+
+
+class CountryReservoir:
+    """Bottom-k reservoir of list rows per country.
+
+    Rows are kept sorted by ``(country, priority)``; ``rank`` is each
+    row's position within its country.
+    """
+
+    def __init__(self, capacity=SAMPLE_CAPACITY, seed=42):
+        self.capacity = capacity
+        self.seed = seed
+        self.country = np.empty(0, dtype=np.int64)
+        self.priority = np.empty(0, dtype=np.uint64)
+        self.columns = {}
+        self.rank = np.empty(0, dtype=np.int64)
+
+    def update(self, country, user_id, **columns):
+        """Offer a chunk of rows; ``columns`` are extra per-row arrays to keep.
+
+        ``user_id`` and ``columns['anime_id']`` form the row key.
+        """
+        columns = {'user_id': user_id, **columns}
+        priority = row_priorities(user_id, columns['anime_id'], self.seed)
+
+        country = np.concatenate([self.country, np.asarray(country, dtype=np.int64)])
+        priority = np.concatenate([self.priority, priority])
+        if not self.columns:
+            self.columns = {name: np.empty(0, dtype=np.asarray(values).dtype) for name, values in columns.items()}
+        columns = {name: np.concatenate([self.columns[name], np.asarray(columns[name])]) for name in self.columns}
+
+        order = np.lexsort((priority, country))
+        country = country[order]
+        starts = np.flatnonzero(np.r_[True, country[1:] != country[:-1]])
+        rank = np.arange(len(country)) - np.repeat(starts, np.diff(np.r_[starts, len(country)]))
+        keep = order[rank < self.capacity]
+
+        self.country = country[rank < self.capacity]
+        self.priority = priority[keep]
+        self.columns = {name: values[keep] for name, values in columns.items()}
+        self.rank = rank[rank < self.capacity]
+
+    def sample(self, size, countries=None):
+        """Up to ``size`` rows per country, as ``(country, {name: array})``.
+
+        ``countries`` optionally restricts the sample to those country codes.
+        """
+        mask = self.rank < size
+        if countries is not None:
+            mask &= np.isin(self.country, countries)
+        return self.country[mask], {name: values[mask] for name, values in self.columns.items()}
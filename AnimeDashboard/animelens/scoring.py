@@ -0,0 +1,307 @@
+"""Scoring new anime with a trained success-prediction model.
+
+:func:`score_batch` takes a table of hypothetical anime with raw catalog
+style fields (:data:`INPUT_FIELDS`: episodes, duration, year, members,
+favorites or their ratio, a comma-separated genre list and a studio).
+It maps them onto the model's feature schema in a single vectorized pass
+and scores every row with one ``predict_proba`` call. Column names are
+matched loosely (case, spaces and a few aliases); columns that already
+carry a model feature, such as a 0/1 ``Action`` column, are used as is.
+Everything else is passed through to the result.
+
+:class:`Predictor` is the fast path for one anime at a time, such as the
+page's what-if form. It keeps the feature positions and an input row
+allocated once per model. It walks a :class:`CompiledForest`, the
+forest's trees flattened into node arrays and evaluated together, which
+avoids scikit-learn's per-call validation and per-tree dispatch.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from animelens.model import BASE_FEATURES, THRESHOLD
+
+# Raw fields a batch can provide, with the value used when a field is missing
+INPUT_FIELDS = {
+    'episodes': 0,
+    'duration_min': 0,
+    'aired_from_year': 2000,
+    'members': 0,
+    'favorites': None,
+    'fav_member_ratio': None,
+    'genre': 'Unknown',
+    'studio': 'Unknown',
+}
+
+# Accepted spellings of the input fields, after lower-casing and replacing spaces with underscores
+COLUMN_ALIASES = {
+    'episode_count': 'episodes',
+    'duration': 'duration_min',
+    'episode_duration': 'duration_min',
+    'year': 'aired_from_year',
+    'release_year': 'aired_from_year',
+    'member_count': 'members',
+    'favourites': 'favorites',
+    'genres': 'genre',
+    'studios': 'studio',
+}
+
+
+@dataclass
+class BatchScores:
+    """Scored batch and how its columns were read."""
+    scores: pd.DataFrame  # the input rows, then success_probability and predicted_success
+    mapping: dict         # input column -> input field or model feature it was read as
+    missing: list         # input fields not found, filled with their defaults
+    unknown_genres: list  # genre names outside the model's schema, ignored
+    seconds: float        # time spent building features and scoring
+
+
+def read_batch(file, name=None):
+    """Read an uploaded CSV or Parquet file (by ``name`` or the file's own name)."""
+    name = name or getattr(file, 'name', str(file))
+    if Path(name).suffix.lower() in ('.parquet', '.pq'):
+        return pd.read_parquet(file)
+    return pd.read_csv(file)
+
+
+def map_columns(df, feature_columns):
+    """Rename the columns of ``df`` to input fields; returns ``(df, mapping)``.
+
+    Columns that are model features keep their name; columns that match
+    neither are left unchanged and not listed in ``mapping``.
+    """
+    features = set(feature_columns)
+    renames, mapping = {}, {}
+    for col in df.columns:
+        name = str(col).strip()
+        field = name.lower().replace(' ', '_')
+        field = COLUMN_ALIASES.get(field, field)
+        if field in INPUT_FIELDS and field not in mapping.values():
+            renames[col] = mapping[col] = field
+        elif name in features:
+            renames[col] = mapping[col] = name
+    return df.rename(columns=renames), mapping
+
+
+def split_genres(genres):
+    """Genre lists of a column of comma-separated names (spaces around commas optional)."""
+    return genres.fillna(INPUT_FIELDS['genre']).astype(str).str.strip().str.split(r'\s*,\s*', regex=True)
+
+
+def _numbers(df, field):
+    default = INPUT_FIELDS[field]
+    if field not in df.columns:
+        return np.full(len(df), default, dtype='float64')
+    return pd.to_numeric(df[field], errors='coerce').fillna(default).to_numpy(dtype='float64')
+
+
+def feature_matrix(df, feature_columns):
+    """Feature rows for input fields ``df`` (see :func:`map_columns`), in ``feature_columns`` order.
+
+    Matches :func:`animelens.model.preprocess_data` on catalog rows:
+    genres outside the schema are dropped and studios outside it count
+    as ``Other``. A favorites ratio that cannot be computed (no members)
+    is 0.
+    """
+    index = {col: i for i, col in enumerate(feature_columns)}
+    X = np.zeros((len(df), len(feature_columns)))
+
+    members = _numbers(df, 'members')
+    if 'fav_member_ratio' in df.columns:
+        ratio = pd.to_numeric(df['fav_member_ratio'], errors='coerce').to_numpy(dtype='float64')
+    elif 'favorites' in df.columns:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = pd.to_numeric(df['favorites'], errors='coerce').to_numpy(dtype='float64') / members
+    else:
+        ratio = np.zeros(len(df))
+    base = {
+        'episodes': _numbers(df, 'episodes'),
+        'duration_min': _numbers(df, 'duration_min'),
+        'aired_from_year': _numbers(df, 'aired_from_year'),
+        'log_members': np.log1p(members),
+        'fav_member_ratio': np.where(np.isfinite(ratio), ratio, 0),
+    }
+    for name, values in base.items():
+        if name in index:
+            X[:, index[name]] = values
+
+    genres = df['genre'] if 'genre' in df.columns else pd.Series(INPUT_FIELDS['genre'], index=df.index)
+    genre_index = genre_positions(feature_columns)
+    lists = split_genres(genres)
+    names = lists.explode()
+    rows = np.repeat(np.arange(len(df)), lists.str.len().to_numpy())
+    position = names.map(genre_index).to_numpy(dtype='float64')
+    known = ~np.isnan(position)
+    X[rows[known], position[known].astype(np.int64)] = 1
+
+    studios = df['studio'] if 'studio' in df.columns else pd.Series(INPUT_FIELDS['studio'], index=df.index)
+    position = ('studio_' + studios.fillna(INPUT_FIELDS['studio']).astype(str)).map(index)
+    position = position.fillna(index.get('studio_Other', -1)).to_numpy(dtype='int64')
+    rows = np.flatnonzero(position >= 0)
+    X[rows, position[rows]] = 1
+
+    # Feature columns given directly override the ones derived above
+    for col in df.columns:
+        if col in index and col not in INPUT_FIELDS:
+            X[:, index[col]] = pd.to_numeric(df[col], errors='coerce').fillna(0).to_numpy(dtype='float64')
+    return X
+
+
+def genre_positions(feature_columns):
+    """Genre feature name -> position in ``feature_columns``."""
+    return {col: i for i, col in enumerate(feature_columns)
+            if col not in BASE_FEATURES and not col.startswith('studio_')}
+
+
+def unknown_genres(df, feature_columns):
+    """Sorted genre names in the ``genre`` field of ``df`` that the model has no feature for."""
+    if 'genre' not in df.columns:
+        return []
+    names = set(split_genres(df['genre']).explode().dropna()) - set(genre_positions(feature_columns))
+    return sorted(name for name in names if name)
+
+
+def score_batch(model, df):
+    """Success probability and prediction (at :data:`THRESHOLD`) for every row of ``df``."""
+    started = time.perf_counter()
+    fields, mapping = map_columns(df, model.feature_columns)
+    # Named like the training frame; wrapping the array does not copy it
+    X = pd.DataFrame(feature_matrix(fields, model.feature_columns), columns=model.feature_columns)
+    proba = model.clf.predict_proba(X)[:, 1] if len(X) else np.zeros(0)
+    seconds = time.perf_counter() - started
+
+    scores = df.copy()
+    scores['success_probability'] = proba
+    scores['predicted_success'] = proba >= THRESHOLD
+    # Either favorites or their ratio to members will do
+    missing = [field for field in INPUT_FIELDS if field not in fields.columns and field != 'fav_member_ratio']
+    if 'fav_member_ratio' in fields.columns and 'favorites' in missing:
+        missing.remove('favorites')
+    return BatchScores(scores, mapping, missing, unknown_genres(fields, model.feature_columns), seconds)
+
+
+def batch_template():
+    """Example batch with every input field, for users to fill in."""
+    return pd.DataFrame({
+        'title': ['Example Action Series', 'Example Romance Film'],
+        'episodes': [12, 1],
+        'duration_min': [24, 110],
+        'aired_from_year': [2024, 2025],
+        'members': [50000, 120000],
+        'favorites': [1500, 4000],
+        'genre': ['Action, Fantasy', 'Drama, Romance'],
+        'studio': ['Madhouse', 'Other'],
+    })
+
+
+@dataclass
+class CompiledForest:
+    """All trees of a fitted forest as one node table.
+
+    Leaves point back to themselves with an infinite threshold, so every
+    tree can take ``depth`` steps regardless of where its leaves are.
+    """
+    feature: np.ndarray    # per node, feature tested (0 at leaves)
+    threshold: np.ndarray  # per node, go left if x[feature] <= threshold
+    left: np.ndarray       # per node, global index of the left child
+    right: np.ndarray
+    proba: np.ndarray      # per node, share of the positive class at that leaf
+    roots: np.ndarray      # per tree, global index of its root
+    depth: int
+
+    def probability(self, x):
+        """Mean positive-class probability of the trees for one feature row ``x``."""
+        # Trees compare float32 features against their thresholds, as scikit-learn does
+        x = np.asarray(x, dtype=np.float32).astype(np.float64)
+        nodes = self.roots
+        for _ in range(self.depth):
+            nodes = np.where(x[self.feature[nodes]] <= self.threshold[nodes], self.left[nodes], self.right[nodes])
+        return float(self.proba[nodes].mean())
+
+
+def compile_forest(clf, positive=1):
+    """Flatten the trees of the fitted forest ``clf``; ``positive`` is the class column to score."""
+    features, thresholds, lefts, rights, probas, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in clf.estimators_:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        leaf = tree.children_left < 0
+        value = tree.value[:, 0, :]
+        roots.append(offset)
+        features.append(np.where(leaf, 0, tree.feature))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold))
+        lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+        rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+        probas.append(value[:, positive] / value.sum(axis=1))
+        offset += tree.node_count
+    return CompiledForest(
+        feature=np.concatenate(features).astype(np.intp),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts).astype(np.intp),
+        right=np.concatenate(rights).astype(np.intp),
+        proba=np.concatenate(probas),
+        roots=np.array(roots, dtype=np.intp),
+        depth=max(estimator.tree_.max_depth for estimator in clf.estimators_),
+    )
+
+
+class Predictor:
+    """Success probability of one anime, without building a DataFrame or calling scikit-learn.
+
+    Built once per model. Calls may come from several sessions at once;
+    they take turns filling the shared input row.
+    """
+
+    def __init__(self, model):
+        index = {col: i for i, col in enumerate(model.feature_columns)}
+        self.base = {name: index[name] for name in BASE_FEATURES if name in index}
+        self.genre_index = genre_positions(model.feature_columns)
+        self.studio_index = {col[len('studio_'):]: i for col, i in index.items() if col.startswith('studio_')}
+        self.row = np.zeros(len(index))
+        self.forest = compile_forest(model.clf, positive=list(model.clf.classes_).index(True))
+        self._lock = threading.Lock()
+
+    @property
+    def genres(self):
+        return list(self.genre_index)
+
+    @property
+    def studios(self):
+        return list(self.studio_index)
+
+    def probability(self, episodes, duration_min, aired_from_year, members, fav_member_ratio=0.0,
+                    genres=(), studio=None):
+        """Success probability for the given fields (see :data:`INPUT_FIELDS`).
+
+        Unknown genres are ignored; a studio outside the schema counts as ``Other``.
+        """
+        values = {
+            'episodes': episodes,
+            'duration_min': duration_min,
+            'aired_from_year': aired_from_year,
+            'log_members': np.log1p(members),
+            'fav_member_ratio': fav_member_ratio,
+        }
+        with self._lock:
+            row = self.row
+            row.fill(0)
+            for name, position in self.base.items():
+                row[position] = values[name]
+            for genre in genres:
+                if genre in self.genre_index:
+                    row[self.genre_index[genre]] = 1
+            position = self.studio_index.get(studio, self.studio_index.get('Other'))
+            if position is not None:
+                row[position] = 1
+            return self.forest.probability(row)
+
+    def predict(self, *args, **kwargs):
+        """``(successful, probability)``, successful meaning at least :data:`THRESHOLD`."""
+        probability = self.probability(*args, **kwargs)
+        return probability >= THRESHOLD, probability
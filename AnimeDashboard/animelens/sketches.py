@@ -0,0 +1,241 @@
+"""Probabilistic sketches of the lists for approximate regional queries.
+
+* :class:`HyperLogLog` estimates distinct users and distinct anime per
+  country, with a relative standard error of ``1.04 / sqrt(2**precision)``.
+* :class:`CountMinSketch` estimates country x genre entry counts. An estimate never undercounts, and with probability
+  ``1 - exp(-depth)`` it overcounts by at most ``e / width`` times the
+  total number of entries added.
+
+Both sketches are fixed-size and mergeable, and are filled in one
+streaming pass over the lists. ``python -m animelens.ingest`` builds them
+after the lists store and saves them to ``data/cache/sketches.npz``.
+"""
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from animelens.data import ANIME_CSV, ANIME_PARQUET, CACHE_DIR, LISTS_CSV, USERS_CSV, is_stale
+from animelens.hashing import pair_keys, splitmix64
+from animelens.lists import genre_indicator
+from animelens.users import USERS_PARQUET
+
+SKETCHES_PATH = CACHE_DIR / "sketches.npz"
+
+# Bump whenever what the sketches count changes
+SKETCHES_VERSION = 2
+
+HLL_PRECISION = 10
+CMS_WIDTH = 1 << 16
+CMS_DEPTH = 4
+
+
+def _bit_length(values):
+    """Exact bit length of a uint64 array."""
+    high = values >> np.uint64(11)
+    exponent = np.where(high > 0,
+                        np.frexp(high.astype(np.float64))[1] + 11,
+                        np.frexp(values.astype(np.float64))[1])
+    return exponent.astype(np.int64)
+
+
+class HyperLogLog:
+    """One HyperLogLog per group, stored as a ``(groups, 2**precision)`` array."""
+
+    def __init__(self, groups, precision=HLL_PRECISION, seed=0, registers=None):
+        self.precision = precision
+        self.seed = seed
+        self.registers = np.zeros((groups, 1 << precision), dtype=np.uint8) if registers is None else registers
+
+    @property
+    def relative_error(self):
+        """Relative standard error of an estimate."""
+        return 1.04 / np.sqrt(self.registers.shape[1])
+
+    def add(self, group, keys):
+        """Add uint64 ``keys`` to the sketch of each row's ``group``."""
+        h = splitmix64(keys, self.seed)
+        p = np.uint64(self.precision)
+        index = (h >> (np.uint64(64) - p)).astype(np.int64)
+        rest = h & ((np.uint64(1) << (np.uint64(64) - p)) - np.uint64(1))
+        rank = (64 - self.precision) - _bit_length(rest) + 1
+        np.maximum.at(self.registers, (np.asarray(group), index), rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        """Estimated distinct keys per group, as a float array."""
+        m = self.registers.shape[1]
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.exp2(-self.registers.astype(np.float64)).sum(axis=1)
+        zeros = (self.registers == 0).sum(axis=1)
+        with np.errstate(divide='ignore'):
+            linear = m * np.log(m / np.maximum(zeros, 1))
+        # Linear counting is more accurate while many registers are empty
+        return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+class CountMinSketch:
+    """Count-min sketch over uint64 keys."""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH, table=None, total=0):
+        self.table = np.zeros((depth, width), dtype=np.int64) if table is None else table
+        self.total = total
+
+    @property
+    def error_bound(self):
+        """Additive overcount bound holding with probability ``1 - exp(-depth)``."""
+        return np.e / self.table.shape[1] * self.total
+
+    @property
+    def confidence(self):
+        return 1 - np.exp(-self.table.shape[0])
+
+    def _columns(self, keys, row):
+        return (splitmix64(keys, row + 1) % np.uint64(self.table.shape[1])).astype(np.int64)
+
+    def add(self, keys):
+        keys = np.asarray(keys, dtype=np.uint64)
+        for row in range(self.table.shape[0]):
+            self.table[row] += np.bincount(self._columns(keys, row), minlength=self.table.shape[1])
+        self.total += len(keys)
+
+    def merge(self, other):
+        self.table += other.table
+        self.total += other.total
+
+    def query(self, keys):
+        keys = np.asarray(keys, dtype=np.uint64)
+        return np.min([self.table[row, self._columns(keys, row)] for row in range(self.table.shape[0])], axis=0)
+
+
+@dataclass
+class RegionalSketches:
+    """Sketches of list entries per country, for the approximate mode of page 5."""
+    countries: pd.Index
+    genres: pd.Index
+    users: HyperLogLog
+    anime_seen: HyperLogLog
+    country_genre: CountMinSketch
+
+    def country_summary(self, country):
+        """``(users, anime, relative_error)``: estimated distinct users and anime."""
+        row = self.countries.get_loc(country)
+        users = float(self.users.estimate()[row])
+        anime = float(self.anime_seen.estimate()[row])
+        return users, anime, self.users.relative_error
+
+    def genre_counts(self, country):
+        """Estimated ``genre, count`` entries for ``country`` (never undercounts)."""
+        row = self.countries.get_loc(country)
+        codes = np.arange(len(self.genres))
+        counts = self.country_genre.query(pair_keys(np.full(len(codes), row), codes))
+        frame = pd.DataFrame({'genre': self.genres, 'count': counts})
+        return frame[frame['count'] > 0].reset_index(drop=True)
+
+
+def _expand_genres(anime_genres, anime_pos):
+    """Repeat each row once per genre of its anime; returns ``(row, genre)``."""
+    indptr = anime_genres.indptr
+    lengths = indptr[anime_pos + 1] - indptr[anime_pos]
+    rows = np.repeat(np.arange(len(anime_pos)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return rows, anime_genres.indices[indptr[anime_pos][rows] + offsets]
+
+
+def _genres(anime):
+    """Anime x genre indicator and genre names, with an ``Unknown`` genre for anime missing from ``anime``."""
+    anime_genres, genres = genre_indicator(anime)
+    if 'Unknown' not in genres:
+        genres = genres.append(pd.Index(['Unknown']))
+    return anime_genres.tocsr(), genres
+
+
+def build_sketches(chunks, users, anime, precision=HLL_PRECISION, width=CMS_WIDTH, depth=CMS_DEPTH):
+    """Fold list chunks into :class:`RegionalSketches`.
+
+    Takes the same inputs as :func:`animelens.lists.aggregate_lists`,
+    and like it counts entries for anime missing from the catalog under
+    genre ``Unknown``.
+    """
+    anime = anime.drop_duplicates('anime_id').reset_index(drop=True)
+    user_country, countries = pd.factorize(users['country'], sort=True)
+    anime_index = pd.Index(anime['anime_id'])
+    anime_genres, genres = _genres(anime)
+    unknown_genre = genres.get_loc('Unknown')
+
+    sketches = RegionalSketches(
+        countries=pd.Index(countries),
+        genres=genres,
+        users=HyperLogLog(len(countries), precision, seed=1),
+        anime_seen=HyperLogLog(len(countries), precision, seed=2),
+        country_genre=CountMinSketch(width, depth),
+    )
+    for chunk in chunks:
+        user_id = np.asarray(chunk['user_id'])
+        known = user_id >= 0
+        user_id, anime_id = user_id[known], np.asarray(chunk['anime_id'])[known]
+        anime_pos = anime_index.get_indexer(anime_id)
+        country = user_country[user_id]
+
+        sketches.users.add(country, user_id.astype(np.uint64))
+        sketches.anime_seen.add(country, anime_id.astype(np.uint64))
+        cataloged = anime_pos >= 0
+        rows, genre = _expand_genres(anime_genres, anime_pos[cataloged])
+        sketches.country_genre.add(pair_keys(country[cataloged][rows], genre))
+        missing = country[~cataloged]
+        sketches.country_genre.add(pair_keys(missing, np.full(len(missing), unknown_genre)))
+    return sketches
+
+
+def save_sketches(sketches, path=SKETCHES_PATH):
+    """Write the sketch arrays to one ``.npz`` file, atomically."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp.npz")
+    meta = {
+        'version': SKETCHES_VERSION,
+        'precision': sketches.users.precision,
+        'country_genre_total': sketches.country_genre.total,
+    }
+    np.savez(
+        tmp,
+        countries=np.asarray(sketches.countries, dtype=str),
+        users=sketches.users.registers,
+        anime_seen=sketches.anime_seen.registers,
+        country_genre=sketches.country_genre.table,
+        meta=np.array(json.dumps(meta)),
+    )
+    os.replace(tmp, path)
+
+
+def sketches_are_stale(path=SKETCHES_PATH, csv_path=LISTS_CSV):
+    # Keys hold anime row positions and genre codes, so a changed catalog invalidates them too
+    catalog = [src for src in (ANIME_CSV, ANIME_PARQUET) if src.exists()]
+    if is_stale(path, csv_path, USERS_CSV, USERS_PARQUET, *catalog):
+        return True
+    with np.load(path) as saved:
+        return json.loads(str(saved['meta'])).get('version') != SKETCHES_VERSION
+
+
+def load_sketches(users, anime, path=SKETCHES_PATH):
+    """Read sketches saved by :func:`save_sketches`.
+
+    ``users`` and ``anime`` must be the tables the sketches were built
+    from; they supply the country, genre and anime indexes.
+    """
+    with np.load(path) as saved:
+        meta = json.loads(str(saved['meta']))
+        anime = anime.drop_duplicates('anime_id').reset_index(drop=True)
+        _, genres = _genres(anime)
+        return RegionalSketches(
+            countries=pd.Index(saved['countries'].astype(object)),
+            genres=genres,
+            users=HyperLogLog(0, meta['precision'], seed=1, registers=saved['users']),
+            anime_seen=HyperLogLog(0, meta['precision'], seed=2, registers=saved['anime_seen']),
+            country_genre=CountMinSketch(table=saved['country_genre'], total=meta['country_genre_total']),
+        )
@@ -0,0 +1,114 @@
+"""Optional DuckDB engine for the regional aggregations of page 5.
+
+:class:`DuckDBRegional` answers the same questions as
+:class:`animelens.lists.RegionalAggregates` with SQL over an embedded,
+in-process DuckDB database. It reads the users and anime Parquet files
+directly. The lists come from the memory-mapped store, handed to DuckDB
+as zero-copy Arrow arrays, or else from the lists CSV. DuckDB runs the
+queries on all cores and spills to ``data/cache/duckdb`` when a query
+does not fit in memory. Query results come back as Arrow tables.
+
+Requires the ``duckdb`` package; pages import this module only when the
+DuckDB engine is selected.
+"""
+import threading
+
+import duckdb
+import pyarrow as pa
+
+from animelens.data import ANIME_PARQUET, CACHE_DIR, LISTS_CSV, anime_table
+from animelens.store import list_store_is_stale, open_list_store
+from animelens.users import USERS_PARQUET, users_table
+
+DUCKDB_TEMP_DIR = CACHE_DIR / "duckdb"
+
+ENTRIES_SQL = """
+CREATE VIEW entries AS
+SELECT l.user_id, l.anime_id, u.country
+FROM lists l JOIN users u USING (user_id)
+"""
+
+ANIME_GENRES_SQL = """
+CREATE VIEW anime_genres AS
+SELECT anime_id, score, unnest(string_split(coalesce(genre, 'Unknown'), ', ')) AS genre
+FROM anime
+"""
+
+
+class DuckDBRegional:
+    """Regional aggregates computed by DuckDB queries."""
+
+    def __init__(self, threads=None):
+        # Make sure the Parquet files exist and are current
+        users_table()
+        anime_table()
+
+        self.con = duckdb.connect()
+        DUCKDB_TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        self.con.execute(f"SET temp_directory = '{DUCKDB_TEMP_DIR}'")
+        if threads is not None:
+            self.con.execute(f"SET threads = {int(threads)}")
+        # One connection is shared by every session of the page
+        self._lock = threading.Lock()
+
+        self.con.execute(f"CREATE VIEW users AS SELECT user_id, username, country FROM read_parquet('{USERS_PARQUET}')")
+        self.con.execute(
+            "CREATE VIEW anime AS SELECT anime_id, any_value(genre) AS genre, any_value(score) AS score "
+            f"FROM read_parquet('{ANIME_PARQUET}') GROUP BY anime_id"
+        )
+        if list_store_is_stale():
+            self.con.execute(
+                "CREATE VIEW lists AS SELECT u.user_id, l.anime_id "
+                f"FROM read_csv('{LISTS_CSV}', header=true) l JOIN users u USING (username)"
+            )
+        else:
+            store = open_list_store()
+            self._lists = pa.table({col: store[col] for col in ('user_id', 'anime_id')})
+            self.con.register('lists', self._lists)
+        self.con.execute(ENTRIES_SQL)
+        self.con.execute(ANIME_GENRES_SQL)
+
+    def query(self, sql, params=None):
+        """Run ``sql`` and return the result as a ``pyarrow.Table``."""
+        with self._lock:
+            return self.con.execute(sql, params or []).fetch_arrow_table()
+
+    def country_activity(self):
+        """List entries per country, most active first."""
+        table = self.query("""
+            SELECT country, count(*) AS entries FROM entries
+            GROUP BY country ORDER BY entries DESC, country
+        """).to_pandas()
+        return table.set_index('country')['entries']
+
+    def genre_counts(self, countries=None):
+        """Long-form ``country, genre, count`` table of list entries.
+
+        Entries for anime missing from the catalog count as ``Unknown``.
+        """
+        where = "" if countries is None else "WHERE e.country IN (SELECT unnest(?))"
+        params = None if countries is None else [[str(c) for c in countries]]
+        return self.query(f"""
+            SELECT e.country, coalesce(g.genre, 'Unknown') AS genre, count(*) AS count
+            FROM entries e LEFT JOIN anime_genres g USING (anime_id)
+            {where}
+            GROUP BY ALL ORDER BY ALL
+        """, params).to_pandas()
+
+    def country_summary(self, country):
+        """Distinct users and distinct anime with list entries in ``country``."""
+        row = self.query("""
+            SELECT count(DISTINCT user_id) AS users, count(DISTINCT anime_id) AS anime
+            FROM entries WHERE country = ?
+        """, [str(country)]).to_pylist()[0]
+        return int(row['users']), int(row['anime'])
+
+    def genre_scores(self, country):
+        """Entry-weighted mean catalog score per genre for ``country``."""
+        frame = self.query("""
+            SELECT g.genre, avg(g.score) AS avg_score, count(*) AS count
+            FROM entries e JOIN anime_genres g USING (anime_id)
+            WHERE e.country = ?
+            GROUP BY g.genre ORDER BY g.genre
+        """, [str(country)]).to_pandas()
+        return frame.astype({'avg_score': 'float64', 'count': 'float64'})
@@ -0,0 +1,226 @@
+"""Memory-mapped column store for the user anime lists.
+
+The build step streams ``animelists_cleaned.csv`` once and writes every
+column as a raw fixed-width numpy file. Pages open the files with
+``np.memmap``. Scans are then zero-copy, and every server process shares
+the same pages through the OS page cache.
+
+A second copy, sorted by the users' country, has an offset index from
+country to its ``[start, end)`` row range. A per-country drill-down then
+maps one contiguous slice and reads no other country's rows.
+
+Build both with::
+
+    python -m animelens.store
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from animelens.data import CACHE_DIR, LISTS_CSV, USERS_CSV, is_stale
+from animelens.lists import CHUNK_ROWS, iter_list_chunks, with_user_ids
+from animelens.users import USERS_PARQUET, load_users, username_index
+
+LIST_STORE_DIR = CACHE_DIR / "lists"
+COUNTRY_STORE_DIR = CACHE_DIR / "lists_by_country"
+
+# user_id is the dense id from the users dimension (animelens.users)
+STORE_COLUMNS = {
+    'user_id': 'int32',
+    'anime_id': 'int32',
+    'my_score': 'int8',
+    'my_status': 'uint8',
+    'my_start_date': 'int32',
+    'my_finish_date': 'int32',
+}
+
+# Dates are stored as days since 1970-01-01; unparseable dates get this value
+MISSING_DAY = np.iinfo(np.int32).min
+
+
+def epoch_days(values):
+    """Convert ``YYYY-MM-DD`` strings to int32 epoch days."""
+    dates = pd.to_datetime(pd.Series(values), format='%Y-%m-%d', errors='coerce')
+    days = dates.to_numpy(dtype='datetime64[D]').astype('int64')
+    days[dates.isna().to_numpy()] = MISSING_DAY
+    return days.astype('int32')
+
+
+# Lists CSV columns the store is built from
+SOURCE_COLUMNS = ['username', 'anime_id', 'my_score', 'my_status', 'my_start_date', 'my_finish_date']
+
+
+def encode_chunk(chunk):
+    """Turn one parsed CSV chunk into the store's fixed-width columns.
+
+    ``chunk`` must already carry the dense ``user_id`` (see
+    :func:`animelens.lists.with_user_ids`). Rows for users missing from the
+    users dimension cannot be attributed to any user or country, so they
+    are dropped. Returns ``({name: array}, dropped_rows)``.
+    """
+    known = chunk[chunk['user_id'] >= 0]
+    columns = {
+        'user_id': known['user_id'].to_numpy(dtype='int32'),
+        'anime_id': known['anime_id'].to_numpy(dtype='int32'),
+        'my_score': known['my_score'].to_numpy(dtype='int8'),
+        'my_status': known['my_status'].to_numpy(dtype='uint8'),
+        'my_start_date': epoch_days(known['my_start_date']),
+        'my_finish_date': epoch_days(known['my_finish_date']),
+    }
+    return columns, len(chunk) - len(known)
+
+
+def write_list_store(encoded_chunks, store_dir=LIST_STORE_DIR, source=None):
+    """Append encoded chunks to column files under ``store_dir``.
+
+    ``encoded_chunks`` yields ``({name: array}, dropped_rows)`` pairs as
+    returned by :func:`encode_chunk`. The store is written to a temporary
+    directory and swapped into place at the end, so readers never see a
+    half-written store.
+    """
+    store_dir = Path(store_dir)
+    tmp_dir = store_dir.with_name(f"{store_dir.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    files = {col: open(tmp_dir / f"{col}.bin", 'wb') for col in STORE_COLUMNS}
+    rows = dropped = 0
+    try:
+        for columns, chunk_dropped in encoded_chunks:
+            for col, dtype in STORE_COLUMNS.items():
+                np.asarray(columns[col], dtype=dtype).tofile(files[col])
+            rows += len(columns['anime_id'])
+            dropped += chunk_dropped
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {'rows': rows, 'dropped_rows': dropped, 'columns': STORE_COLUMNS, 'source': source}
+    (tmp_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    return open_list_store(store_dir)
+
+
+def build_list_store(usernames, csv_path=LISTS_CSV, store_dir=LIST_STORE_DIR, chunk_rows=CHUNK_ROWS):
+    """Stream ``csv_path`` into a store under ``store_dir`` in one process.
+
+    ``usernames`` is the users dimension's username index. For the full
+    Kaggle file, ``python -m animelens.ingest`` does the same work in
+    parallel.
+    """
+    chunks = with_user_ids(iter_list_chunks(csv_path, columns=SOURCE_COLUMNS, chunk_rows=chunk_rows), usernames)
+    return write_list_store((encode_chunk(chunk) for chunk in chunks), store_dir, source=str(csv_path))
+
+
+def list_store_is_stale(store_dir=LIST_STORE_DIR, csv_path=LISTS_CSV):
+    """Return True if the store is older than the lists or users CSV."""
+    return is_stale(Path(store_dir) / "meta.json", csv_path, USERS_CSV)
+
+
+def build_country_store(store, user_country, countries, store_dir=COUNTRY_STORE_DIR, chunk_rows=CHUNK_ROWS):
+    """Write ``store`` sorted by country, with a country -> row range index.
+
+    ``user_country`` maps each ``user_id`` to a position in ``countries``.
+    This is a two-pass counting sort over store chunks: the first pass
+    counts rows per country, the second scatters each chunk into its
+    countries' ranges. Memory stays at one chunk, and rows keep their
+    original order within a country.
+    """
+    store_dir = Path(store_dir)
+    tmp_dir = store_dir.with_name(f"{store_dir.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    user_country = np.asarray(user_country)
+    counts = np.zeros(len(countries), dtype=np.int64)
+    for chunk in iter_store_chunks(store, ['user_id'], chunk_rows):
+        counts += np.bincount(user_country[chunk['user_id']], minlength=len(countries))
+    ends = np.cumsum(counts)
+    cursor = ends - counts
+    rows = int(counts.sum())
+
+    if rows:
+        out = {
+            col: np.memmap(tmp_dir / f"{col}.bin", dtype=dtype, mode='w+', shape=(rows,))
+            for col, dtype in STORE_COLUMNS.items()
+        }
+        for chunk in iter_store_chunks(store, list(STORE_COLUMNS), chunk_rows):
+            country = user_country[chunk['user_id']]
+            order = np.argsort(country, kind='stable')
+            chunk_counts = np.bincount(country, minlength=len(countries))
+            first = np.cumsum(chunk_counts) - chunk_counts
+            sorted_country = country[order]
+            pos = cursor[sorted_country] + np.arange(len(order)) - first[sorted_country]
+            for col in STORE_COLUMNS:
+                out[col][pos] = chunk[col][order]
+            cursor += chunk_counts
+        for values in out.values():
+            values.flush()
+        del out
+
+    offsets = {
+        str(country): [int(end - count), int(end)]
+        for country, count, end in zip(countries, counts, ends) if count
+    }
+    meta = {'rows': rows, 'columns': STORE_COLUMNS, 'countries': offsets}
+    (tmp_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+
+
+def country_store_is_stale(store_dir=COUNTRY_STORE_DIR, list_store_dir=LIST_STORE_DIR):
+    """Return True if the country-sorted store is older than the lists store or users dimension."""
+    return is_stale(Path(store_dir) / "meta.json", Path(list_store_dir) / "meta.json", USERS_CSV, USERS_PARQUET)
+
+
+def open_country_rows(country, store_dir=COUNTRY_STORE_DIR):
+    """Map only ``country``'s rows of the country-sorted store.
+
+    Returns ``{name: np.memmap}`` over the country's row range; a country
+    without list entries gets empty arrays.
+    """
+    store_dir = Path(store_dir)
+    meta = json.loads((store_dir / "meta.json").read_text())
+    start, end = meta['countries'].get(str(country), (0, 0))
+    if end == start:
+        return {col: np.empty(0, dtype=dtype) for col, dtype in meta['columns'].items()}
+    return {
+        col: np.memmap(store_dir / f"{col}.bin", dtype=dtype, mode='r',
+                       offset=start * np.dtype(dtype).itemsize, shape=(end - start,))
+        for col, dtype in meta['columns'].items()
+    }
+
+
+def open_list_store(store_dir=LIST_STORE_DIR):
+    """Map every column of the store read-only; returns ``{name: np.memmap}``."""
+    store_dir = Path(store_dir)
+    meta = json.loads((store_dir / "meta.json").read_text())
+    if meta['rows'] == 0:
+        return {col: np.empty(0, dtype=dtype) for col, dtype in meta['columns'].items()}
+    return {
+        col: np.memmap(store_dir / f"{col}.bin", dtype=dtype, mode='r', shape=(meta['rows'],))
+        for col, dtype in meta['columns'].items()
+    }
+
+
+def iter_store_chunks(store, columns=None, chunk_rows=CHUNK_ROWS):
+    """Yield ``{name: array}`` slices of the store without copying."""
+    columns = list(store) if columns is None else columns
+    rows = len(store[columns[0]])
+    for start in range(0, rows, chunk_rows):
+        yield {col: store[col][start:start + chunk_rows] for col in columns}
+
+
+if __name__ == "__main__":
+    store = build_list_store(username_index())
+    print(f"Wrote {len(store['anime_id']):,} list entries to {LIST_STORE_DIR}")
+    user_country, countries = pd.factorize(load_users(['country'])['country'], sort=True)
+    build_country_store(store, user_country, countries)
+    print(f"Wrote the country-sorted copy to {COUNTRY_STORE_DIR}")
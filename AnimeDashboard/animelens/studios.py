@@ -0,0 +1,118 @@
+"""Studio x genre x rating-bucket count cube for the Sankey diagram of page 3.
+
+:class:`StudioCube` counts (studio, genre) pairs per one-point score
+bucket in a dense array, built once from the catalog's genre bits without
+exploding the genre lists. Top-N rankings, drill-down slices and the
+Sankey links are all array operations on that cube, so the diagram costs
+the same for any number of studios and genres.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from animelens.data import catalog_genres, load_anime
+from animelens.genres import multi_hot
+
+# Score buckets 0.0 .. 10.0 (bucket i holds scores in [i, i + 1)), then unscored anime
+RATING_BUCKETS = [f"{i}.0" for i in range(11)]
+UNRATED = len(RATING_BUCKETS)
+
+
+@dataclass
+class SankeyLinks:
+    """Sankey nodes and links; node ``i`` is ``labels[i]``."""
+    labels: list
+    studios: list
+    genres: list
+    ratings: list
+    source: np.ndarray
+    target: np.ndarray
+    value: np.ndarray
+    hover: np.ndarray
+
+
+@dataclass
+class StudioCube:
+    """Counts of ``(studio, genre, rating bucket)`` triples."""
+    studios: pd.Index
+    genres: pd.Index
+    counts: np.ndarray  # studios x genres x (RATING_BUCKETS + unrated), int64
+
+    def _positions(self, index, names):
+        return np.arange(len(index)) if names is None else index.get_indexer(list(names))
+
+    def top_studios(self, n, genres=None):
+        """The ``n`` studios with most genre tags, counting only ``genres`` if given."""
+        totals = self.counts[:, self._positions(self.genres, genres)].sum(axis=(1, 2))
+        order = np.argsort(-totals, kind='stable')[:n]
+        return self.studios[order[totals[order] > 0]].tolist()
+
+    def top_genres(self, n, studios=None):
+        """The ``n`` most frequent genres, counting only ``studios`` if given."""
+        totals = self.counts[self._positions(self.studios, studios)].sum(axis=(0, 2))
+        order = np.argsort(-totals, kind='stable')[:n]
+        return self.genres[order[totals[order] > 0]].tolist()
+
+    def sankey(self, studios, genres):
+        """Studio -> genre -> rating links between ``studios`` and ``genres``.
+
+        Studio -> genre links carry the pair counts over scored anime;
+        genre -> rating links are kept per studio so their hover text
+        names it. Rating nodes run from 10.0 down to 0.0.
+        """
+        studio_pos = self._positions(self.studios, studios)
+        genre_pos = self._positions(self.genres, genres)
+        cube = self.counts[np.ix_(studio_pos, genre_pos)][:, :, :UNRATED]
+        n_studios, n_genres = len(studio_pos), len(genre_pos)
+        studio_names = np.asarray(studios, dtype=object)
+        genre_names = np.asarray(genres, dtype=object)
+        ratings = RATING_BUCKETS[::-1]
+        rating_names = np.asarray(RATING_BUCKETS, dtype=object)
+
+        pairs = cube.sum(axis=2)
+        si, gi = np.nonzero(pairs)
+        pair_hover = 'Studio: ' + studio_names[si] + '<br>Genre: ' + genre_names[gi]
+
+        ts, tg, tr = np.nonzero(cube)
+        triple_hover = ('Genre: ' + genre_names[tg] + '<br>Rating: ' + rating_names[tr]
+                        + '<br>Studio: ' + studio_names[ts])
+
+        genre_node = n_studios + np.concatenate([gi, tg])
+        rating_node = n_studios + n_genres + (UNRATED - 1 - tr)
+        return SankeyLinks(
+            labels=list(studios) + list(genres) + ratings,
+            studios=list(studios),
+            genres=list(genres),
+            ratings=ratings,
+            source=np.concatenate([si, genre_node[len(gi):]]),
+            target=np.concatenate([genre_node[:len(gi)], rating_node]),
+            value=np.concatenate([pairs[si, gi], cube[ts, tg, tr]]),
+            hover=np.concatenate([pair_hover, triple_hover]),
+        )
+
+
+def build_studio_cube(df, vocab):
+    """Count ``(studio, genre, rating bucket)`` over catalog rows ``df``.
+
+    Missing or blank studios count as ``Unknown``.
+    """
+    studio = df['studio'].fillna('Unknown')
+    studio = studio.mask(studio.str.strip() == '', 'Unknown')
+    studio_codes, studios = pd.factorize(studio, sort=True)
+
+    score = df['score'].to_numpy(dtype='float64')
+    bucket = np.where(np.isnan(score), UNRATED, np.clip(np.floor(np.nan_to_num(score)), 0, 10)).astype(np.int64)
+
+    rows, genre_codes = np.nonzero(multi_hot(df['genre_bits'], vocab))
+    shape = (len(studios), len(vocab), UNRATED + 1)
+    flat = np.ravel_multi_index((studio_codes[rows], genre_codes, bucket[rows]), shape)
+    counts = np.bincount(flat, minlength=np.prod(shape)).reshape(shape)
+    return StudioCube(pd.Index(studios), pd.Index(vocab), counts)
+
+
+@lru_cache(maxsize=None)
+def studio_cube():
+    """Cube of the whole catalog, built once per process."""
+    return build_studio_cube(load_anime(['studio', 'genre_bits', 'score']), catalog_genres())
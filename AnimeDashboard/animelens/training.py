@@ -0,0 +1,176 @@
+"""Background training and evaluation of the success-prediction model.
+
+:func:`start_training` launches ``python -m animelens.training KEY`` as a
+separate process. The process trains the model for the current catalog
+and saves it to the registry (see :mod:`animelens.model`), then runs its
+cross-validation (see :mod:`animelens.evaluation`), so no server thread
+blocks on a fit. While it runs it writes its progress to
+``{key}.progress.json`` next to the models: trees fitted, then
+cross-validation fits done. Page 6 keeps serving the last saved model
+(:func:`animelens.model.latest_key`) and swaps in the new one once its
+file appears.
+
+A ``{key}.lock`` file holding the worker's pid keeps concurrent sessions
+from starting the same training twice; a lock whose process has died is
+taken over.
+
+Train and evaluate the model for the current catalog ahead of time with::
+
+    python -m animelens.training
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import traceback
+from pathlib import Path
+
+from animelens.data import load_anime
+from animelens.evaluation import evaluate, evaluation_path, save_evaluation
+from animelens.model import (MODEL_DIR, MODEL_PARAMS, SOURCE_COLUMNS, current_key, model_path, preprocess_data,
+                             save_model, train_model)
+
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+
+# Workers started by this process, by key; polling them also reaps them once they exit
+_workers = {}
+
+
+def progress_path(key):
+    return MODEL_DIR / f"{key}.progress.json"
+
+
+def lock_path(key):
+    return MODEL_DIR / f"{key}.lock"
+
+
+def read_progress(key):
+    """Last progress written for ``key``: a dict with ``stage``, ``done`` and ``total``, or None.
+
+    ``stage`` is ``'starting'``, ``'trees'``, ``'folds'`` (cross-validation
+    fits), ``'done'`` or ``'failed'`` (with the traceback under ``error``).
+    """
+    try:
+        return json.loads(progress_path(key).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_progress(key, stage, done=0, total=0, **extra):
+    path = progress_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    state = {'stage': stage, 'done': done, 'total': total, 'pid': os.getpid(), 'time': time.time(), **extra}
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _lock_owner(key):
+    try:
+        return int(lock_path(key).read_text() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def is_training(key):
+    """True while a live worker holds the lock for ``key``."""
+    if key in _workers and _workers[key].poll() is not None:
+        del _workers[key]
+    owner = _lock_owner(key)
+    return owner > 0 and _alive(owner)
+
+
+def _acquire(key):
+    """Create the lock for ``key`` with this process as owner; False if a live worker holds it."""
+    path = lock_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if is_training(key):
+                return False
+            # Left behind by a worker that died; take it over
+            path.unlink(missing_ok=True)
+            continue
+        with os.fdopen(fd, 'w') as lock:
+            lock.write(str(os.getpid()))
+        return True
+    return False
+
+
+def is_trained(key):
+    """True once both the model for ``key`` and its evaluation are saved."""
+    return model_path(key).exists() and evaluation_path(key).exists()
+
+
+def start_training(key, retry=False):
+    """Train and evaluate the model for ``key`` in a background process, unless done or under way.
+
+    A failed run is not restarted unless ``retry`` is set. Returns True
+    if a worker was started.
+    """
+    if is_trained(key):
+        return False
+    state = read_progress(key)
+    if state and state['stage'] == 'failed' and not retry:
+        return False
+    if not _acquire(key):
+        return False
+    write_progress(key, 'starting')
+    try:
+        worker = subprocess.Popen([sys.executable, '-m', 'animelens.training', key], cwd=PACKAGE_ROOT,
+                                  stdout=subprocess.DEVNULL)
+    except OSError:
+        lock_path(key).unlink(missing_ok=True)
+        raise
+    _workers[key] = worker
+    # Hand the lock over to the worker, unless it has already finished
+    if worker.poll() is None:
+        lock_path(key).write_text(str(worker.pid))
+    return True
+
+
+def train_and_evaluate(key, params=MODEL_PARAMS, progress=None):
+    """Train and save the model for ``key``, then its evaluation, skipping what is saved already."""
+    features, labels = preprocess_data(load_anime(SOURCE_COLUMNS))
+    if not model_path(key).exists():
+        save_model(train_model(features, labels, params, key, progress))
+    if not evaluation_path(key).exists():
+        save_evaluation(evaluate(features, labels, params, key, progress=progress))
+
+
+def train_in_worker(key, params=MODEL_PARAMS):
+    """Worker body: :func:`train_and_evaluate`, writing progress as it goes."""
+    try:
+        train_and_evaluate(key, params, progress=lambda stage, done, total: write_progress(key, stage, done, total))
+        write_progress(key, 'done')
+    except Exception:
+        write_progress(key, 'failed', error=traceback.format_exc())
+        raise
+    finally:
+        lock_path(key).unlink(missing_ok=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        train_in_worker(sys.argv[1])
+    else:
+        key = current_key()
+        if not _acquire(key):
+            sys.exit(f"model {key} is already being trained")
+        started = time.perf_counter()
+        train_in_worker(key)
+        print(f"model {key}: {model_path(key)}, evaluation: {evaluation_path(key)} "
+              f"({time.perf_counter() - started:.1f}s)")
@@ -0,0 +1,69 @@
+"""Users dimension with dense integer ids.
+
+Every user in ``users_cleaned.csv`` gets a ``user_id`` equal to their row
+position in the dimension. The username column, stored in id order, is
+the persisted username -> id dictionary. The lists store carries only
+that integer key, so attaching user attributes to list rows is an array
+gather (``country_code[user_id]``) rather than a merge on strings.
+
+MyAnimeList's own user id is kept as ``mal_user_id``. ``country`` is
+normalized from ``location`` (see :mod:`animelens.countries`), with its
+categorical codes also stored as the int16 ``country_code``.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from animelens.countries import COUNTRIES, UNKNOWN_COUNTRY, normalize_countries
+from animelens.data import CACHE_DIR, USERS_CSV, VERSION_METADATA_KEY, is_stale, write_parquet_atomic
+
+USERS_PARQUET = CACHE_DIR / "users.parquet"
+
+# Bump whenever the build output changes
+USERS_VERSION = b'4'
+
+
+def build_users_dimension(csv_path=USERS_CSV, parquet_path=USERS_PARQUET):
+    """Assign dense user ids and store the users table as Parquet."""
+    df = pd.read_csv(csv_path)
+    df = df.drop_duplicates('username').reset_index(drop=True)
+    df = df.rename(columns={'user_id': 'mal_user_id'})
+    df.insert(0, 'user_id', np.arange(len(df), dtype='int32'))
+
+    if 'location' in df.columns:
+        df['country'] = normalize_countries(df['location'])
+    else:
+        df['country'] = pd.Categorical([UNKNOWN_COUNTRY] * len(df), categories=COUNTRIES)
+    df['country_code'] = df['country'].cat.codes.astype('int16')
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), VERSION_METADATA_KEY: USERS_VERSION})
+    write_parquet_atomic(table, parquet_path)
+    return table
+
+
+@lru_cache(maxsize=None)
+def users_table():
+    """The users dimension as an immutable Arrow table, shared process-wide."""
+    if is_stale(USERS_PARQUET, USERS_CSV):
+        return build_users_dimension()
+    table = pq.read_table(USERS_PARQUET)
+    if (table.schema.metadata or {}).get(VERSION_METADATA_KEY) != USERS_VERSION:
+        return build_users_dimension()
+    return table
+
+
+def load_users(columns=None):
+    """Return a fresh pandas copy of the users dimension, in ``user_id`` order."""
+    table = users_table()
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas()
+
+
+def username_index():
+    """``pd.Index`` of usernames whose positions are the dense user ids."""
+    return pd.Index(users_table().column('username').to_pandas())
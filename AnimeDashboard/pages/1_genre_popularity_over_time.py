@@ -4,6 +4,11 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
+import time
+
+from animelens.data import catalog_genres, load_anime
+from animelens.growth import genre_year_matrix, growth_summary, rank_trajectories, rolling_mean
+from animelens.olap import anime_cube
 
 st.set_page_config(layout="wide", page_title="Anime Genre Evolution", page_icon="📊")
 
@@ -32,19 +37,22 @@ Compare trends, discover patterns, and identify rising genres in anime history.
 # Loading and preprocessing the data
 @st.cache_data
 def load_data():
-    df = pd.read_csv("./data/anime_cleaned.csv")
+    df = load_anime(['aired_from_year', 'genre'])
     df = df.dropna(subset=['aired_from_year', 'genre'])
     df['aired_from_year'] = df['aired_from_year'].astype(int)
-    df['genre'] = df['genre'].str.split(', ')
-    
-    for col in ['score', 'popularity', 'members']:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
     
-    return df
+    return df, catalog_genres()
+
+# Growth analytics for every genre, over the all-genre x year matrix
+@st.cache_data
+def load_growth(year_range, window, normalize):
+    matrix = genre_year_matrix(year_range)
+    if normalize:
+        matrix = (matrix / matrix.sum(axis=0).replace(0, np.nan) * 100).fillna(0)
+    smoothed = rolling_mean(matrix, window)
+    return growth_summary(matrix), smoothed, rank_trajectories(smoothed)
 
-df = load_data()
-df_exploded = df.explode('genre')
+df, genre_vocab = load_data()
 
 # Different Tabs
 tab1, tab2, tab3, tab4 = st.tabs(["📈 Trend Analysis", "📊 Yearly Comparison", "🔥 Heatmap View", "⚖️ Genre Growth"])
@@ -52,11 +60,11 @@ tab1, tab2, tab3, tab4 = st.tabs(["📈 Trend Analysis", "📊 Yearly Comparison
 st.sidebar.header("📋 Visualization Controls")
 
 # Year range filter
-min_year, max_year = int(df_exploded['aired_from_year'].min()), int(df_exploded['aired_from_year'].max())
+min_year, max_year = int(df['aired_from_year'].min()), int(df['aired_from_year'].max())
 year_range = st.sidebar.slider("Select Year Range", min_year, max_year, (min_year, max_year))
 
 # Genre selection with search
-unique_genres = sorted(df_exploded['genre'].dropna().unique())
+unique_genres = genre_vocab
 selected_genres = st.sidebar.multiselect(
     "Select Genres",
     unique_genres,
@@ -78,25 +86,16 @@ theme_map = {
     "Rainbow": px.colors.sequential.Rainbow
 }
 
-# Filter data based on selections
-filtered = df_exploded[
-    (df_exploded['aired_from_year'] >= year_range[0]) &
-    (df_exploded['aired_from_year'] <= year_range[1]) &
-    (df_exploded['genre'].isin(selected_genres))
-]
-
-# Prepare data for visualization
-genre_trend = (
-    filtered.groupby(['aired_from_year', 'genre'])['title']
-    .count()
-    .reset_index()
-    .rename(columns={'title': 'count'})
-)
+# Prepare data for visualization: per-year counts of the selected genres, from the cube
+query_start = time.perf_counter()
+genre_trend = anime_cube().query(['aired_from_year', 'genre'], years=year_range, levels={'genre': selected_genres})
+genre_trend = genre_trend[['aired_from_year', 'genre', 'count']]
+st.sidebar.caption(f"Cube query time: {(time.perf_counter() - query_start) * 1000:.0f} ms")
 
 # Apply normalization if selected
 if normalize:
-    # Get total anime per year
-    total_per_year = filtered.groupby('aired_from_year')['title'].count().reset_index()
+    # Get total genre tags per year
+    total_per_year = genre_trend.groupby('aired_from_year')['count'].sum().reset_index()
     total_per_year.columns = ['aired_from_year', 'total']
     
     # Merge with genre counts
@@ -110,6 +109,14 @@ else:
     value_column = 'count'
     value_label = 'Number of Anime Released'
 
+# Growth of the selected genres: one genre x year matrix of the plotted values
+value_matrix = (
+    genre_trend.pivot(index='genre', columns='aired_from_year', values=value_column)
+    .reindex(columns=range(year_range[0], year_range[1] + 1))
+    .fillna(0)
+)
+selected_growth = growth_summary(value_matrix).set_index('Genre')
+
 # Tab 1: Trend Line Chart
 with tab1:
     st.header("Genre Popularity Trends Over Time")
@@ -142,26 +149,18 @@ with tab1:
     # Show statistics below the chart
     stats_cols = st.columns(len(selected_genres))
     
-    for i, genre in enumerate(selected_genres):  # Limit to 4 stats boxes
-        genre_data = genre_trend[genre_trend['genre'] == genre]
-        if not genre_data.empty:
-            latest_year = genre_data['aired_from_year'].max()
-            latest_count = genre_data[genre_data['aired_from_year'] == latest_year][value_column].values[0]
+    for i, genre in enumerate(selected_genres):
+        if genre in selected_growth.index:
+            growth = selected_growth.loc[genre]
+            latest_count = growth['Final Value']
             
-            # Calculate growth vs previous year
-            if latest_year > year_range[0]:
-                prev_year_data = genre_data[genre_data['aired_from_year'] == latest_year - 1]
-                if not prev_year_data.empty:
-                    prev_count = prev_year_data[value_column].values[0]
-                    yoy_change = ((latest_count / prev_count) - 1) * 100
-                    stats_cols[i % len(selected_genres)].metric(f"{genre}", 
-                                           f"{int(latest_count)}", 
-                                           f"{yoy_change:+.1f}% vs. prev. year")
-                else:
-                    stats_cols[i % len(selected_genres)].metric(f"{genre}", 
-                                           f"{int(latest_count)}")
+            # Growth vs previous year, when it had anime of this genre
+            if not np.isnan(growth['Latest YoY (%)']):
+                stats_cols[i].metric(f"{genre}", 
+                                     f"{int(latest_count)}", 
+                                     f"{growth['Latest YoY (%)']:+.1f}% vs. prev. year")
             else:
-                stats_cols[i % len(selected_genres)].metric(f"{genre}", 
+                stats_cols[i].metric(f"{genre}", 
                                      f"{int(latest_count)}")
 
 # Tab 2: Yearly Comparison Bar Chart
@@ -170,7 +169,7 @@ with tab2:
     
     # Select specific years to compare
     num_years = st.slider("Number of years to compare", 2, 10, 2)
-    available_years = sorted(filtered['aired_from_year'].unique())
+    available_years = sorted(genre_trend['aired_from_year'].unique())
     
     # Try to select last N years, or as many as available
     default_years = available_years[-num_years:] if len(available_years) >= num_years else available_years
@@ -326,39 +325,12 @@ with tab3:
 with tab4:
     st.header("Genre Growth Analysis")
     
-    # Calculate growth between first and last year
-    growth_data = []
+    # Growth between the first and last year of each selected genre
+    growth_df = selected_growth[selected_growth['Years'] >= 2].reset_index()
+    growth_df = growth_df[['Genre', 'First Year', 'Last Year', 'Initial Value', 'Final Value', 'Change', 'CAGR (%)']]
     
-    for genre in selected_genres:
-        genre_data = genre_trend[genre_trend['genre'] == genre].sort_values('aired_from_year')
-        
-        if len(genre_data) >= 2:
-            # Get first and last data points
-            first_year = genre_data['aired_from_year'].min()
-            last_year = genre_data['aired_from_year'].max()
-            
-            first_value = genre_data[genre_data['aired_from_year'] == first_year][value_column].values[0]
-            last_value = genre_data[genre_data['aired_from_year'] == last_year][value_column].values[0]
-            
-            # Calculate compound annual growth rate
-            years_diff = last_year - first_year
-            if years_diff > 0 and first_value > 0:
-                cagr = (((last_value / first_value) ** (1 / years_diff)) - 1) * 100
-            else:
-                cagr = None
-                
-            growth_data.append({
-                'Genre': genre,
-                'First Year': first_year,
-                'Last Year': last_year,
-                'Initial Value': first_value,
-                'Final Value': last_value,
-                'Change': last_value - first_value,
-                'CAGR (%)': cagr
-            })
-    
-    if growth_data:
-        growth_df = pd.DataFrame(growth_data)
+    if not growth_df.empty:
+        first_year, last_year = growth_df['First Year'].min(), growth_df['Last Year'].max()
         
         # Sort by growth rate
         growth_df = growth_df.sort_values('CAGR (%)', ascending=False)
@@ -422,6 +394,44 @@ with tab4:
     else:
         st.warning("Not enough data to calculate growth rates. Try selecting more genres or a wider year range.")
 
+    # All-genre leaderboard and rank trajectories
+    st.subheader("All-Genre Growth Leaderboard")
+    col1, col2 = st.columns(2)
+    window = col1.slider("Rolling average window (years)", 1, 10, 3)
+    bump_n = col2.slider("Genres in bump chart", 3, 20, 10)
+    
+    all_growth, smoothed, ranks = load_growth(year_range, window, normalize)
+    leaderboard = all_growth.set_index('Genre')
+    leaderboard[f'{window}-Year Avg'] = smoothed.iloc[:, -1]
+    leaderboard['Rank'] = ranks.iloc[:, -1]
+    leaderboard['Rank Change'] = ranks.iloc[:, 0] - ranks.iloc[:, -1]
+    leaderboard = leaderboard.sort_values('CAGR (%)', ascending=False).reset_index()
+    
+    st.dataframe(leaderboard.drop(columns=['Years']), use_container_width=True)
+    
+    # Bump chart: yearly rank of the rolling average, for the genres ranked highest in the last year
+    top_genres = ranks.iloc[:, -1].nsmallest(bump_n, keep='first').index
+    bump_data = ranks.loc[top_genres].reset_index().melt(id_vars='genre', var_name='aired_from_year', value_name='rank')
+    
+    bump_fig = px.line(
+        bump_data,
+        x='aired_from_year',
+        y='rank',
+        color='genre',
+        markers=True,
+        labels={'aired_from_year': 'Year', 'rank': 'Rank', 'genre': 'Genre'},
+        title=f'Genre Rank Trajectories ({window}-Year Rolling Average)',
+        color_discrete_sequence=theme_map[color_theme],
+        height=600
+    )
+    
+    bump_fig.update_layout(
+        template='plotly_white',
+        yaxis=dict(autorange='reversed', dtick=1),
+    )
+    
+    st.plotly_chart(bump_fig, use_container_width=True)
+
 # Data table in expander
 with st.expander("📊 View and Download Data"):
     st.dataframe(genre_trend, use_container_width=True)
@@ -4,6 +4,11 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
+import time
+
+from animelens.data import catalog_genres, load_anime
+from animelens.queries import BACKEND_LABELS, backend_selector, seasonal_anime
+from animelens.seasons import seasonal_cube
 
 # Page configuration
 st.set_page_config(layout="wide", page_title="Anime Seasonal Patterns", page_icon="📅")
@@ -34,18 +39,13 @@ Discover which seasons bring the highest-rated shows and how seasonal distributi
 # Load and preprocess data
 @st.cache_data
 def load_data():
-    df = pd.read_csv("./data/anime_cleaned.csv")
+    df = load_anime()
     # Clean and extract seasonal data
     df = df.dropna(subset=['premiered'])
     df[['season', 'season_year']] = df['premiered'].str.split(' ', expand=True)
     df = df.dropna(subset=['season_year','season'])
     df['season_year'] = df['season_year'].astype(int)
     
-    # Convert score and popularity to numeric
-    for col in ['score', 'popularity', 'members', 'favorites']:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
     # Ensure standard season naming and ordering
     season_order = {'Winter': 0, 'Spring': 1, 'Summer': 2, 'Fall': 3}
     df = df[df['season'].isin(season_order.keys())]
@@ -71,52 +71,36 @@ seasons = ['Winter', 'Spring', 'Summer', 'Fall']
 selected_seasons = st.sidebar.multiselect("Select Seasons", seasons, default=seasons)
 
 # Additional filters
+selected_genres = []
+genre_match = "Any"
 if 'genre' in df.columns:
-    all_genres = sorted(set([genre for genres in df['genre'].dropna() for genre in genres.split(', ')]))
-    selected_genres = st.sidebar.multiselect("Filter by Genre", all_genres)
-    
-    if selected_genres:
-        genre_filter = df['genre'].apply(lambda x: any(genre in str(x).split(', ') for genre in selected_genres) if pd.notnull(x) else False)
-        df = df[genre_filter]
-
+    genre_vocab = catalog_genres()
+    selected_genres = st.sidebar.multiselect("Filter by Genre", genre_vocab)
+    genre_match = st.sidebar.radio("Genre Match", ["Any", "All"], horizontal=True,
+                                   help="Keep anime with any or all of the selected genres")
 
+# Row-level views (box plots, top anime, data table); both backends run the same filters
+backend = backend_selector()
 
 # Filter dataset based on selections
-filtered_df = df[
-    (df['season_year'] >= year_range[0]) &
-    (df['season_year'] <= year_range[1]) &
-    (df['season'].isin(selected_seasons))
-]
-
-# Calculate aggregates for visualization
-release_trend = (
-    filtered_df.groupby(['season_year', 'season', 'season_order'])['title']
-    .count()
-    .reset_index()
-    .rename(columns={'title': 'anime_count'})
-    .sort_values(['season_year', 'season_order'])
-)
-
-seasonal_scores = (
-    filtered_df.groupby(['season_year', 'season'])['score']
-    .mean()
-    .reset_index()
-    .sort_values(['season_year', 'season'])
-)
+filters = dict(year_range=year_range, seasons=selected_seasons, genres=selected_genres,
+               match_all=genre_match == "All")
+query_start = time.perf_counter()
+filtered_df = seasonal_anime(backend=backend, **filters)
+st.sidebar.caption(f"{BACKEND_LABELS[backend]} query time: {(time.perf_counter() - query_start) * 1000:.0f} ms")
 
-seasonal_popularity = (
-    filtered_df.groupby(['season_year', 'season'])['popularity']
-    .mean()
-    .reset_index()
-    .sort_values(['season_year', 'season'])
-)
+# Calculate aggregates for visualization from the season x year x genre cube
+cube = seasonal_cube()
+trend = cube.trend(**filters)
+release_trend = trend[['season_year', 'season', 'season_order', 'anime_count']]
+seasonal_scores = trend[['season_year', 'season', 'score']].sort_values(['season_year', 'season'])
+seasonal_popularity = trend[['season_year', 'season', 'popularity']].sort_values(['season_year', 'season'])
 
 # Seasonal statistics for the entire period
-overall_seasonal_stats = filtered_df.groupby('season').agg(
-    avg_score=('score', 'mean'),
-    avg_popularity=('popularity', 'mean'),
-    total_anime=('title', 'count')
-).reset_index()
+season_stats = cube.season_stats(**filters)
+overall_seasonal_stats = season_stats[['season', 'score', 'popularity', 'anime_count']].rename(
+    columns={'score': 'avg_score', 'popularity': 'avg_popularity', 'anime_count': 'total_anime'}
+)
 
 # TAB 1: Release Trends
 with tab1:
@@ -160,8 +144,8 @@ with tab1:
     # Select specific years to compare
     comparison_years = st.multiselect(
         "Select years to compare",
-        options=sorted(filtered_df['season_year'].unique()),
-        default=list(sorted(filtered_df['season_year'].unique())[-3:]) if len(filtered_df['season_year'].unique()) >= 3 else list(sorted(filtered_df['season_year'].unique()))
+        options=sorted(release_trend['season_year'].unique()),
+        default=list(sorted(release_trend['season_year'].unique())[-3:]) if len(release_trend['season_year'].unique()) >= 3 else list(sorted(release_trend['season_year'].unique()))
     )
     
     if comparison_years:
@@ -278,12 +262,10 @@ with tab2:
     st.plotly_chart(fig_score_trend, use_container_width=True)
     
     # Add insights about seasonal trends
-    insights = filtered_df.groupby('season').agg(
-        avg_episodes=('episodes', 'mean'),
-        avg_members=('members', 'mean') if 'members' in filtered_df.columns else ('score', 'count'),
-        top_score=('score', 'max'),
-        bottom_score=('score', 'min')
-    ).reset_index()
+    insights = season_stats[['season', 'episodes', 'members', 'score_max', 'score_min']].rename(
+        columns={'episodes': 'avg_episodes', 'members': 'avg_members',
+                 'score_max': 'top_score', 'score_min': 'bottom_score'}
+    )
     
     st.subheader("Seasonal Insights")
     st.dataframe(insights, use_container_width=True)
@@ -292,15 +274,8 @@ with tab2:
 with tab3:
     st.header("Seasonal Release Patterns Heatmap")
     
-    # Create a pivot table for the heatmap
-    pivot_data = release_trend.pivot_table(
-        values='anime_count',
-        index='season',
-        columns='season_year'
-    ).fillna(0)
-    
-    # Reorder seasons
-    pivot_data = pivot_data.reindex(["Winter", "Spring", "Summer", "Fall"])
+    # Season x year slice of the cube, seasons in calendar order
+    pivot_data = cube.pivot('anime_count', fill_value=0, **filters)
     
     # Create heatmap
     fig_heatmap = px.imshow(
@@ -326,16 +301,8 @@ with tab3:
     if 'score' in filtered_df.columns:
         st.subheader("Seasonal Score Heatmap")
         
-        # Create a pivot table for scores
-        score_pivot = filtered_df.pivot_table(
-            values='score',
-            index='season',
-            columns='season_year',
-            aggfunc='mean'
-        )
-        
-        # Reorder seasons
-        score_pivot = score_pivot.reindex(["Winter", "Spring", "Summer", "Fall"])
+        # Mean score per season and year, seasons in calendar order
+        score_pivot = cube.pivot('score', **filters)
         
         # Create heatmap
         fig_score_heatmap = px.imshow(
@@ -360,16 +327,8 @@ with tab3:
     if 'popularity' in filtered_df.columns:
         st.subheader("Seasonal Popularity(Ranking) Heatmap")
         
-        # Create a pivot table for scores
-        popularity_pivot = filtered_df.pivot_table(
-            values='popularity',
-            index='season',
-            columns='season_year',
-            aggfunc='mean'
-        )
-        
-        # Reorder seasons
-        popularity_pivot = popularity_pivot.reindex(["Winter", "Spring", "Summer", "Fall"])
+        # Mean popularity per season and year, seasons in calendar order
+        popularity_pivot = cube.pivot('popularity', **filters)
         
         # Create heatmap
         fig_score_heatmap = px.imshow(
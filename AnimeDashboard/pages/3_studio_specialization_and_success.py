@@ -2,17 +2,27 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import numpy as np
+import time
+
+from animelens.data import load_anime
+from animelens import queries
+from animelens.studios import studio_cube
 
 st.set_page_config(layout="wide")
 st.title("🎥 Anime Studio Insights Dashboard")
 
-df_anime = pd.read_csv("./data/anime_cleaned.csv")
-df_genre_studio = df_anime[['studio', 'genre']].dropna()
-df_genre_studio['genre'] = df_genre_studio['genre'].str.split(',')
-df_genre_studio = df_genre_studio.explode('genre')
-df_genre_studio['genre'] = df_genre_studio['genre'].str.strip()
-df_genre_studio['studio'] = df_genre_studio['studio'].str.strip()
-studio_genre_counts = df_genre_studio.groupby(['genre', 'studio']).size().reset_index(name='count')
+@st.cache_data
+def load_data():
+    return load_anime()
+
+df_anime = load_data()
+
+# Both backends run the same explode and (genre, studio) counts
+backend = queries.backend_selector()
+query_start = time.perf_counter()
+studio_genre_counts = queries.studio_genre_counts(backend=backend)
+st.sidebar.caption(f"{queries.BACKEND_LABELS[backend]} query time: {(time.perf_counter() - query_start) * 1000:.0f} ms")
 
 st.header("🏆 Top Studios by Genre")
 top_n = st.slider("Select Top N Studios per Genre", 1, 10, 3)
@@ -74,31 +84,28 @@ with tab2:
     st.plotly_chart(fig, use_container_width=True)
 
 with tab3:
-        # Load and clean data
-    anime_df = pd.read_csv('./data/anime_cleaned.csv')
-    anime_df['studio'] = anime_df['studio'].fillna('Unknown')
-    anime_df.loc[anime_df['studio'].str.strip() == '', 'studio'] = 'Unknown'
-    anime_df['genre_list'] = anime_df['genre'].str.split(', ')
-    anime_exploded = anime_df.explode('genre_list').dropna(subset=['genre_list'])
-
-    # Top studios and genres
-    top_studios = anime_exploded['studio'].value_counts().head(10).index.tolist()
-    top_genres = anime_exploded['genre_list'].value_counts().head(6).index.tolist()
-
-    df = anime_exploded[
-        anime_exploded['studio'].isin(top_studios) &
-        anime_exploded['genre_list'].isin(top_genres)
-    ].copy()
-
-    # Rating buckets (10.0 to 0.0)
-    df['rating_bucket'] = (df['score'] // 1).astype(int).clip(0, 10).astype(str) + '.0'
-    rating_nodes = [f"{i}.0" for i in range(10, -1, -1)]
-
-    # Node order and mapping
-    studio_nodes = top_studios
-    genre_nodes = top_genres
-    all_nodes = studio_nodes + genre_nodes + rating_nodes
-    node_map = {name: i for i, name in enumerate(all_nodes)}
+    # Studio x genre x rating cube, built once per process
+    cube = studio_cube()
+
+    col1, col2 = st.columns(2)
+    n_studios = col1.slider("Top N studios", 1, min(30, len(cube.studios)), min(10, len(cube.studios)))
+    n_genres = col2.slider("Top N genres", 1, len(cube.genres), min(6, len(cube.genres)))
+
+    # Drill down into one studio (its top genres) or one genre (its top studios)
+    drill_options = (["None"] + [f"Studio: {s}" for s in cube.top_studios(n_studios)]
+                     + [f"Genre: {g}" for g in cube.top_genres(n_genres)])
+    drill = st.selectbox("Drill down into", drill_options)
+    if drill.startswith("Studio: "):
+        top_studios = [drill[len("Studio: "):]]
+        top_genres = cube.top_genres(n_genres, studios=top_studios)
+    elif drill.startswith("Genre: "):
+        top_genres = [drill[len("Genre: "):]]
+        top_studios = cube.top_studios(n_studios, genres=top_genres)
+    else:
+        top_studios = cube.top_studios(n_studios)
+        top_genres = cube.top_genres(n_genres)
+
+    links = cube.sankey(top_studios, top_genres)
 
     # Pastel color palettes
     studio_colors = [
@@ -115,34 +122,14 @@ with tab3:
         hex_color = hex_color.lstrip('#')
         return f'rgba({int(hex_color[0:2],16)},{int(hex_color[2:4],16)},{int(hex_color[4:6],16)},{alpha})'
 
-    studio_color_map = {studio: color for studio, color in zip(studio_nodes, studio_colors)}
-    genre_color_map = {genre: color for genre, color in zip(genre_nodes, genre_colors)}
-    rating_color_map = {rating: color for rating, color in zip(rating_nodes, rating_colors)}
-
-    # Aggregate for Sankey: studio→genre→rating
-    studio_genre_rating = df.groupby(['studio', 'genre_list', 'rating_bucket']).size().reset_index(name='count')
-
-    sources, targets, values, link_colors, customdata = [], [], [], [], []
-
-    # Studio→Genre links
-    for _, row in studio_genre_rating.iterrows():
-        sources.append(node_map[row['studio']])
-        targets.append(node_map[row['genre_list']])
-        values.append(row['count'])
-        link_colors.append(hex_to_rgba(studio_color_map[row['studio']], 0.25))
-        customdata.append(f"Studio: {row['studio']}<br>Genre: {row['genre_list']}")
-
-    # Genre→Rating links
-    for _, row in studio_genre_rating.iterrows():
-        sources.append(node_map[row['genre_list']])
-        targets.append(node_map[row['rating_bucket']])
-        values.append(row['count'])
-        link_colors.append(hex_to_rgba(genre_color_map[row['genre_list']], 0.25))
-        customdata.append(f"Genre: {row['genre_list']}<br>Rating: {row['rating_bucket']}<br>Studio: {row['studio']}")
-
-    # Node colors (opaque)
-    node_colors = studio_colors + genre_colors + rating_colors
+    # Node colors, repeating the palettes when N exceeds them; links take their source's color
+    node_colors = (
+        [studio_colors[i % len(studio_colors)] for i in range(len(links.studios))]
+        + [genre_colors[i % len(genre_colors)] for i in range(len(links.genres))]
+        + rating_colors
+    )
     node_colors_rgba = [hex_to_rgba(c, 0.95) for c in node_colors]
+    link_colors = np.array([hex_to_rgba(c, 0.25) for c in node_colors], dtype=object)[links.source]
 
     fig = go.Figure(data=[go.Sankey(
         arrangement="snap",
@@ -150,7 +137,7 @@ with tab3:
             pad=18,
             thickness=24,
             line=dict(color="rgba(255,255,255,0.0)", width=1),
-            label=all_nodes,
+            label=links.labels,
             color=node_colors_rgba,
             hoverlabel=dict(
                 bgcolor='white',
@@ -158,11 +145,11 @@ with tab3:
             )
         ),
         link=dict(
-            source=sources,
-            target=targets,
-            value=values,
+            source=links.source,
+            target=links.target,
+            value=links.value,
             color=link_colors,
-            customdata=customdata,
+            customdata=links.hover,
             hovertemplate='%{customdata}<br>Count: %{value}<extra></extra>',
         )
     )])
@@ -5,6 +5,12 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from statsmodels.nonparametric.smoothers_lowess import lowess
+import time
+
+from animelens.data import catalog_genres
+from animelens.genres import genre_pairs
+from animelens.olap import anime_cube
+from animelens.queries import BACKEND_LABELS, EPISODE_LABELS, backend_selector, episode_anime
 
 # Set page configuration
 st.set_page_config(page_title="Anime Episode Count Analysis", layout="wide")
@@ -19,32 +25,17 @@ including score, popularity, members, favorites, genres, studios, and temporal t
 # Load data
 @st.cache_data
 def load_data():
-    df = pd.read_csv("./data/anime_cleaned.csv")
-    # Basic data cleaning
-    df['episodes'] = pd.to_numeric(df['episodes'], errors='coerce')
-    df = df[df['episodes'] > 0]
-    df['score'] = pd.to_numeric(df['score'], errors='coerce')
-    df['popularity'] = pd.to_numeric(df['popularity'], errors='coerce')
-    df['members'] = pd.to_numeric(df['members'], errors='coerce')
-    df['favorites'] = pd.to_numeric(df['favorites'], errors='coerce')
-    
-    # Create episode categories
-    bins = [0, 1, 12, 24, 50, 100, float('inf')]
-    labels = ['Movie/Special', 'Short (1-12)', 'Medium (13-24)', 'Long (25-50)', 'Very Long (51-100)', 'Ultra (>100)']
-    df['episode_category'] = pd.cut(df['episodes'], bins=bins, labels=labels)
-    
-    # Ensure genre is list
-    if 'genre' in df.columns:
-        df['genre_list'] = df['genre'].fillna('Unknown').str.split(', ')
-    
-    return df
+    # Anime with episodes, with their episode categories
+    df = episode_anime(backend='pandas')
+    return df, catalog_genres()
 
-df = load_data()
+df, genre_vocab = load_data()
 
 # Sidebar for filtering
 st.sidebar.header("📋 Filters")
 
 # Year range filter if available
+year_range = None
 if 'aired_from_year' in df.columns:
     year_min = int(df['aired_from_year'].min())
     year_max = int(df['aired_from_year'].max())
@@ -53,37 +44,46 @@ if 'aired_from_year' in df.columns:
         year_min, year_max, 
         (year_min, year_max)
     )
-    df_filtered = df[(df['aired_from_year'] >= year_range[0]) & (df['aired_from_year'] <= year_range[1])]
-else:
-    df_filtered = df
 
 # Genre filter if available
-if 'genre_list' in df.columns:
-    all_genres = set()
-    for genres in df['genre_list'].dropna():
-        all_genres.update(genres)
-    
+selected_genres = []
+genre_match = "Any"
+if 'genre_bits' in df.columns:
     selected_genres = st.sidebar.multiselect(
         "Select Genres",
-        sorted(all_genres),
+        genre_vocab,
         []
     )
-    
-    if selected_genres:
-        mask = df_filtered['genre_list'].apply(lambda x: any(genre in x for genre in selected_genres) if isinstance(x, list) else False)
-        df_filtered = df_filtered[mask]
+    genre_match = st.sidebar.radio("Genre Match", ["Any", "All"], horizontal=True,
+                                   help="Keep anime with any or all of the selected genres")
 
 # Type filter if available
+selected_types = []
 if 'type' in df.columns:
-    types = df_filtered['type'].dropna().unique()
+    types = df['type'].dropna().unique()
     selected_types = st.sidebar.multiselect(
         "Select Types",
         types,
         []
     )
-    
-    if selected_types:
-        df_filtered = df_filtered[df_filtered['type'].isin(selected_types)]
+
+# Both backends run the same filters and yearly aggregates
+backend = backend_selector()
+
+query_start = time.perf_counter()
+filters = dict(year_range=year_range, genres=selected_genres, match_all=genre_match == "All",
+               types=selected_types, backend=backend)
+df_filtered = episode_anime(**filters)
+st.sidebar.caption(f"{BACKEND_LABELS[backend]} query time: {(time.perf_counter() - query_start) * 1000:.0f} ms")
+
+# Same filters for the aggregate views, answered by the cube; anime with episodes have a bucket
+cube = anime_cube()
+cube_filters = dict(
+    years=year_range,
+    where={'episode_bucket': EPISODE_LABELS, 'genre': selected_genres,
+           **({'type': selected_types} if selected_types else {})},
+    match_all=genre_match == "All",
+)
 
 # Main content
 tab1, tab2 = st.tabs(["📈 Basic Analysis", "🔍 Advanced Analysis"])
@@ -114,7 +114,13 @@ with tab1:
         
         # Episode category distribution
         st.subheader("Episode Length Distribution")
-        category_counts = df_filtered['episode_category'].value_counts().reset_index()
+        category_counts = (
+            cube.query(['episode_bucket'], **cube_filters)
+            .set_index('episode_bucket')['count']
+            .reindex(EPISODE_LABELS, fill_value=0)
+            .sort_values(ascending=False, kind='stable')
+            .reset_index()
+        )
         category_counts.columns = ['Category', 'Count']
     
 
@@ -188,12 +194,12 @@ with tab1:
     if 'aired_from_year' in df.columns:
         st.header("Episode Count Trends Over Time")
         
-        # Calculate average episode count by year
-        yearly_episodes = df_filtered.groupby('aired_from_year').agg(
-            avg_episodes=('episodes', 'mean'),
-            median_episodes=('episodes', 'median'),
-            anime_count=('episodes', 'count')
-        ).reset_index()
+        # Average and count by year from the cube; medians are not additive, so they come from the rows
+        yearly_episodes = cube.query(['aired_from_year'], **cube_filters)[['aired_from_year', 'episodes', 'episodes_n']]
+        yearly_episodes.columns = ['aired_from_year', 'avg_episodes', 'anime_count']
+        yearly_episodes.insert(2, 'median_episodes', yearly_episodes['aired_from_year'].map(
+            df_filtered.groupby('aired_from_year')['episodes'].median()
+        ))
         
         # Create tabs for different views
         trend_tabs = st.tabs(["Average", "Median", "Count by Year"])
@@ -269,22 +275,25 @@ with tab2:
                 st.plotly_chart(fig, use_container_width=True)
 
     # 5. Genre and Episode Count Analysis
-    if 'genre_list' in df_filtered.columns:
+    if 'genre_bits' in df_filtered.columns:
         st.header("Genre and Episode Count Analysis")
         
-        # Explode the genre list to get one row per genre
-        df_exploded = df_filtered.explode('genre_list')
+        # Top genres and their average episodes from the cube
+        genre_episodes = cube.query(['genre'], **cube_filters)
+        genre_episodes = genre_episodes.sort_values('count', ascending=False, kind='stable').head(15)
+        top_genres = genre_episodes['genre']
         
-        # Get top genres
-        top_genres = df_exploded['genre_list'].value_counts().head(15).index
-        df_top_genres = df_exploded[df_exploded['genre_list'].isin(top_genres)]
+        # Medians from one (anime, genre) row per set bit, without exploding lists
+        rows, row_genres = genre_pairs(df_filtered['genre_bits'], genre_vocab, top_genres)
+        genre_medians = pd.Series(df_filtered['episodes'].to_numpy()[rows]).groupby(row_genres).median()
         
         # Average episodes by genre
-        genre_episodes = df_top_genres.groupby('genre_list').agg(
-            avg_episodes=('episodes', 'mean'),
-            median_episodes=('episodes', 'median'),
-            anime_count=('episodes', 'count')
-        ).reset_index().sort_values('avg_episodes', ascending=False)
+        genre_episodes = pd.DataFrame({
+            'genre': genre_episodes['genre'],
+            'avg_episodes': genre_episodes['episodes'],
+            'median_episodes': genre_episodes['genre'].map(genre_medians),
+            'anime_count': genre_episodes['episodes_n'],
+        }).reset_index(drop=True).sort_values('avg_episodes', ascending=False)
         
       
         
@@ -292,10 +301,10 @@ with tab2:
         # Bar chart for average episodes
         fig = px.bar(
             genre_episodes, 
-            x='genre_list', 
+            x='genre', 
             y='avg_episodes',
             color='anime_count',
-            labels={'genre_list': 'Genre', 'avg_episodes': 'Average Episodes', 'anime_count': 'Anime Count'},
+            labels={'genre': 'Genre', 'avg_episodes': 'Average Episodes', 'anime_count': 'Anime Count'},
             title="Average Episode Count by Genre"
         )
         fig.update_layout(template='plotly_white')
@@ -403,13 +412,17 @@ with tab2:
     st.header("Statistical Summary Tables")
 
     # Summary by episode category
-    summary_by_category = df_filtered.groupby('episode_category').agg(
-        anime_count=('episodes', 'count'),
-        avg_score=('score', 'mean') if 'score' in df_filtered.columns else ('episodes', 'count'),
-        avg_popularity=('popularity', 'mean') if 'popularity' in df_filtered.columns else ('episodes', 'count'),
-        avg_members=('members', 'mean') if 'members' in df_filtered.columns else ('episodes', 'count'),
-        avg_favorites=('favorites', 'mean') if 'favorites' in df_filtered.columns else ('episodes', 'count'),
-    ).reset_index()
+    summary_by_category = (
+        cube.query(['episode_bucket'], **cube_filters)
+        .set_index('episode_bucket')
+        .reindex(pd.Index(EPISODE_LABELS, name='episode_category'))
+        [['episodes_n', 'score', 'popularity', 'members', 'favorites']]
+        .fillna({'episodes_n': 0})
+        .astype({'episodes_n': 'int64'})
+        .reset_index()
+    )
+    summary_by_category.columns = ['episode_category', 'anime_count', 'avg_score', 'avg_popularity',
+                                   'avg_members', 'avg_favorites']
 
     for col in summary_by_category.columns:
         if col != 'episode_category' and col != 'anime_count':
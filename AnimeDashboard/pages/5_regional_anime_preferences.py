@@ -4,35 +4,101 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from animelens.data import REGIONAL_ENGINE, load_anime
+from animelens.lists import aggregate_lists, iter_list_chunks, with_user_ids
+from animelens.sampling import SAMPLE_CAPACITY, CountryReservoir
+from animelens.sketches import build_sketches, load_sketches, save_sketches, sketches_are_stale
+from animelens.store import (
+    country_store_is_stale, iter_store_chunks, list_store_is_stale, open_country_rows, open_list_store,
+)
+from animelens.users import load_users, username_index
 
 # Page configuration
 st.set_page_config(page_title="🌍 Regional Anime Preferences", layout="wide")
 st.title("📊 Regional Anime Preferences Analysis")
 st.markdown("Explore how anime preferences vary across different countries and regions.")
 
+def list_chunks():
+    # Scan the memory-mapped lists store if it has been built, otherwise
+    # stream the lists CSV; neither loads the lists file whole
+    if list_store_is_stale():
+        return with_user_ids(iter_list_chunks(), username_index())
+    return iter_store_chunks(open_list_store(), ['user_id', 'anime_id'])
+
 # Load data with caching
-@st.cache_data
+@st.cache_resource
 def load_data():
-    df_users = pd.read_csv("./data/users_cleaned.csv")
-    df_anime_lists = pd.read_csv("./data/animelists_cleaned.csv")
-    df_anime = pd.read_csv("./data/anime_cleaned.csv")
-    return df_users, df_anime_lists, df_anime
+    # The users and anime tables are independent; read them side by side
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        users_future = pool.submit(load_users)
+        anime_future = pool.submit(load_anime, ['anime_id', 'genre', 'score'])
+        df_users, df_anime = users_future.result(), anime_future.result()
+    return df_users, df_anime
+
+@st.cache_resource
+def load_aggregates(_df_users, _df_anime):
+    # A per-country sample is drawn in the same pass for the sampled mode
+    reservoir = CountryReservoir(capacity=SAMPLE_CAPACITY, seed=42)
+    return aggregate_lists(list_chunks(), _df_users, _df_anime, reservoir)
+
+@st.cache_resource
+def load_duckdb():
+    # Imported here so duckdb is only needed when that engine is selected
+    from animelens.sql import DuckDBRegional
+    return DuckDBRegional()
 
-df_users, df_anime_lists, df_anime = load_data()
+# Exact aggregates for one country, read from its slice of the
+# country-sorted store only
+@st.cache_resource(max_entries=32)
+def load_country_view(country, _df_users, _df_anime):
+    return aggregate_lists([open_country_rows(country)], _df_users, _df_anime)
 
-# Clean country data
-if 'location' in df_users.columns:
-    df_users['country'] = df_users['location'].str.extract(r'([A-Za-z\s]+)$')[0]
-    df_users['country'] = df_users['country'].fillna('Unknown').str.strip()
+# Sketches for the approximate mode; `python -m animelens.ingest` saves
+# them, otherwise they are built on first use
+@st.cache_resource
+def load_regional_sketches(_df_users, _df_anime):
+    if sketches_are_stale():
+        sketches = build_sketches(list_chunks(), _df_users, _df_anime)
+        save_sketches(sketches)
+        return sketches
+    return load_sketches(_df_users, _df_anime)
+
+df_users, df_anime = load_data()
+
+# Both engines answer the same queries, so they can be compared side by side
+engines = {"pandas": "pandas", "duckdb": "DuckDB"}
+engine = st.sidebar.radio(
+    "Query engine",
+    list(engines.values()),
+    index=list(engines).index(REGIONAL_ENGINE) if REGIONAL_ENGINE in engines else 0,
+    help="Default set by the ANIMELENS_REGIONAL_ENGINE environment variable"
+)
+if engine == "DuckDB":
+    regional = load_duckdb()
 else:
-    df_users['country'] = 'Unknown'
+    regional = load_aggregates(df_users, df_anime)
+query_seconds = 0.0
+
+def exact_country_view(country):
+    # Drill down into the country's own slice when the sorted store exists
+    if engine == "DuckDB" or list_store_is_stale() or country_store_is_stale():
+        return regional
+    return load_country_view(country, df_users, df_anime)
 
 # Create tabs for different analyses
 tab1, tab2, tab3 = st.tabs(["📺 Watch Time Analysis", "🎭 Genre Preferences", "🔍 Detailed Country Analysis"])
 
 with tab1:
     # Watch time analysis
-    watchtime_region = df_users.groupby('country')['user_days_spent_watching'].sum().sort_values(ascending=False).head(15)
+    # country_code is the categorical code of the normalized country
+    watchtime = np.bincount(df_users['country_code'], weights=df_users['user_days_spent_watching'].fillna(0),
+                            minlength=len(df_users['country'].cat.categories))
+    watchtime_region = pd.Series(watchtime, index=df_users['country'].cat.categories)
+    watchtime_region = watchtime_region[np.bincount(df_users['country_code'], minlength=len(watchtime)) > 0]
+    watchtime_region = watchtime_region.sort_values(ascending=False).head(15)
     
     fig1 = px.bar(
         watchtime_region,
@@ -63,51 +129,26 @@ with tab1:
         st.metric("Total Users", f"{user_count:,}")
 
 with tab2:
-    # Merge dataframes and prepare for stratified sampling
-    st.subheader("🔥 Genre Popularity by Country (Stratified Sample)")
+    st.subheader("🔥 Genre Popularity by Country")
     
-    # Stratified sampling controls
-    sample_size = st.slider("Total Sample Size", 5000, 50000, 10000, step=1000)
+    count_mode = st.radio("Counts", ["Exact", "Stratified Sample"], horizontal=True)
+    if count_mode == "Stratified Sample":
+        sample_size = st.slider("Total Sample Size", 5000, 50000, 10000, step=1000)
     top_n_countries = st.slider("Number of Top Countries to Show", 5, 20, 10)
     
-    # Perform stratified sampling
-    st.info("Using stratified sampling to ensure fair representation of each country")
-    
-    # Merge data
-    merged = pd.merge(df_anime_lists, df_users[['username', 'country']], on='username', how='left')
-    merged = pd.merge(merged, df_anime[['anime_id', 'genre']], on='anime_id', how='left')
-    
     # Find top countries by activity
-    top_regions = merged.groupby('country').size().sort_values(ascending=False).head(top_n_countries).index
-    merged_top = merged[merged['country'].isin(top_regions)]
-    
-    # Stratified sampling
-    @st.cache_data
-    def stratified_sample(df, country_col, max_per_country):
-        countries = df[country_col].unique()
-        sampled_data = []
-        
-        for country in countries:
-            country_data = df[df[country_col] == country]
-            # If country has less than max_per_country, take all; else sample
-            if len(country_data) > max_per_country:
-                country_sample = country_data.sample(max_per_country, random_state=42)
-            else:
-                country_sample = country_data
-            sampled_data.append(country_sample)
-        
-        return pd.concat(sampled_data)
-    
-    # Calculate samples per country based on total desired sample size
-    max_per_country = sample_size // len(top_regions)
-    sampled_merged = stratified_sample(merged_top, 'country', max_per_country)
-    
-    # Process genre data
-    sampled_merged['genre'] = sampled_merged['genre'].fillna('Unknown').str.split(', ')
-    sampled_merged = sampled_merged.explode('genre')
+    query_start = time.perf_counter()
+    top_regions = regional.country_activity().head(top_n_countries).index
     
     # Group by country and genre
-    genre_region = sampled_merged.groupby(['country', 'genre']).size().reset_index(name='count')
+    if count_mode == "Stratified Sample":
+        st.info("Using stratified sampling to ensure fair representation of each country")
+        max_per_country = min(sample_size // len(top_regions), SAMPLE_CAPACITY)
+        genre_region = load_aggregates(df_users, df_anime).sampled_genre_counts(max_per_country, top_regions)
+    else:
+        st.info("Counts cover every list entry, aggregated while streaming the lists file")
+        genre_region = regional.genre_counts(top_regions)
+    query_seconds += time.perf_counter() - query_start
     
     # Create a pivot table for the heatmap
     heatmap_data = genre_region.pivot_table(index='genre', columns='country', values='count', fill_value=0)
@@ -132,7 +173,7 @@ with tab2:
         filtered_heatmap,
         labels=dict(x="Country", y="Genre", color="Popularity" if not normalize else "Percentage (%)"),
         aspect="auto",
-        title=f"Genre Popularity by Country (Top {top_n_countries} Countries, Stratified Sample)",
+        title=f"Genre Popularity by Country (Top {top_n_countries} Countries)",
         color_continuous_scale="Viridis"
     )
     fig2.update_layout(template='plotly_white', height=800)
@@ -184,10 +225,34 @@ with tab3:
         index=0
     )
     
-    if selected_country:
-        country_data = merged[merged['country'] == selected_country]
-        users_count = country_data['username'].nunique()
-        anime_count = country_data['anime_id'].nunique()
+    approximate = st.checkbox("⚡ Approximate mode (sketches)",
+                              help="Answer from HyperLogLog and count-min sketches with stated error bounds")
+    
+    if selected_country and approximate:
+        sketches = load_regional_sketches(df_users, df_anime)
+        users_count, anime_count, relative_error = sketches.country_summary(selected_country)
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Number of Users", f"~{users_count:,.0f}", help=f"HyperLogLog estimate, ±{2 * relative_error:.1%} at ~95% confidence")
+        with col2:
+            st.metric("Anime Watched", f"~{anime_count:,.0f}", help=f"HyperLogLog estimate, ±{2 * relative_error:.1%} at ~95% confidence")
+        with col3:
+            avg_per_user = anime_count / users_count if users_count > 0 else 0
+            st.metric("Avg. Anime per User", f"~{avg_per_user:.1f}")
+        
+        # Count-min estimates never undercount
+        genre_counts = sketches.genre_counts(selected_country)
+        genre_counts = genre_counts.sort_values('count', ascending=False).head(10)
+        st.caption(
+            f"Genre counts may overcount by at most {sketches.country_genre.error_bound:,.0f} entries "
+            f"with {sketches.country_genre.confidence:.1%} confidence"
+        )
+    elif selected_country:
+        query_start = time.perf_counter()
+        country_view = exact_country_view(selected_country)
+        users_count, anime_count = country_view.country_summary(selected_country)
+        query_seconds += time.perf_counter() - query_start
         
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -199,9 +264,11 @@ with tab3:
             st.metric("Avg. Anime per User", f"{avg_per_user:.1f}")
         
         # Genre preferences for selected country
-        country_genres = sampled_merged[sampled_merged['country'] == selected_country]
-        genre_counts = country_genres.groupby('genre').size().reset_index(name='count')
+        country_genres = genre_region[genre_region['country'] == selected_country]
+        genre_counts = country_genres[['genre', 'count']]
         genre_counts = genre_counts.sort_values('count', ascending=False).head(10)
+    
+    if selected_country:
         
         fig4 = px.pie(
             genre_counts,
@@ -216,22 +283,13 @@ with tab3:
         if 'score' in df_anime.columns:
             st.subheader(f"Average Scores by Genre in {selected_country}")
             
-            # Merge score data
-            country_scores = pd.merge(
-                country_data[['anime_id', 'username']],
-                df_anime[['anime_id', 'genre', 'score']],
-                on='anime_id'
-            )
-            
-            # Process genre data
-            country_scores['genre'] = country_scores['genre'].fillna('Unknown').str.split(', ')
-            country_scores = country_scores.explode('genre')
-            
-            # Calculate average scores
-            genre_scores = country_scores.groupby('genre').agg(
-                avg_score=('score', 'mean'),
-                count=('anime_id', 'count')
-            ).reset_index()
+            # Entry-weighted catalog scores per genre, exact in both modes: count-min
+            # estimates summed over a genre's anime would be mostly overcount
+            query_start = time.perf_counter()
+            if approximate:
+                country_view = exact_country_view(selected_country)
+            genre_scores = country_view.genre_scores(selected_country)
+            query_seconds += time.perf_counter() - query_start
             
             # Filter to genres with enough data
             genre_scores = genre_scores[genre_scores['count'] >= 5].sort_values('avg_score', ascending=False)
@@ -246,10 +304,12 @@ with tab3:
                 color_continuous_scale='Viridis'
             )
             st.plotly_chart(fig5, use_container_width=True)
+            if approximate:
+                st.caption("Average scores are exact; sketches only estimate the counts above.")
 
 # Add a data table in an expander
-with st.expander("📊 View Sample Data"):
-    st.dataframe(sampled_merged.head(1000))
+with st.expander("📊 View Aggregated Data"):
+    st.dataframe(genre_region.head(1000))
 
 # Download option
 if 'genre_region' in locals():
@@ -260,3 +320,5 @@ if 'genre_region' in locals():
         file_name="anime_genre_by_region.csv",
         mime="text/csv"
     )
+
+st.sidebar.caption(f"{engine} query time on this run: {query_seconds * 1000:.0f} ms")
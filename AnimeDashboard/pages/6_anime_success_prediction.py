@@ -4,11 +4,15 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, confusion_matrix, roc_curve, auc
 from sklearn.preprocessing import StandardScaler
 import shap
+import time
+
+from animelens.evaluation import evaluation_path, load_evaluation
+from animelens.model import current_key, latest_key, load_model, model_path
+from animelens.scoring import Predictor, batch_template, read_batch, score_batch
+from animelens.training import read_progress, start_training
 
 # Page configuration
 st.set_page_config(
@@ -60,83 +64,59 @@ Success is defined as having a score of 7.5 or higher on MyAnimeList.
 </div>
 """, unsafe_allow_html=True)
 
-# Load data
-@st.cache_data
-def load_data():
-    df = pd.read_csv("./data/anime_cleaned.csv")
-    return df
+# Models come from the registry; a missing one is trained in a background process
+@st.cache_resource
+def catalog_model_key():
+    return current_key()
 
-df_anime = load_data()
+@st.cache_resource(max_entries=4)
+def load_registered_model(key):
+    return load_model(key)
 
-# Data preprocessing
-def preprocess_data(df):
-    # Define success threshold
-    df['successful'] = df['score'] >= 7
-    
-    # Handle missing values
-    df['episodes'] = pd.to_numeric(df['episodes'], errors='coerce').fillna(0)
-    df['duration_min'] = pd.to_numeric(df['duration_min'], errors='coerce').fillna(0)
-    df['aired_from_year'] = pd.to_numeric(df['aired_from_year'], errors='coerce').fillna(2000)
-    df['members'] = pd.to_numeric(df['members'], errors='coerce').fillna(0)
-    
-    # Create log transformations for skewed features
-    df['log_members'] = np.log1p(df['members'])
-    
-    # Genre encoding
-    df['genre'] = df['genre'].fillna('Unknown').astype(str).str.split(', ')
-    genres_dummies = df['genre'].explode().str.get_dummies().groupby(level=0).sum()
-    
-    # Studio encoding (only top studios)
-    df['studio'] = df['studio'].fillna('Unknown')
-    top_studios = df['studio'].value_counts().nlargest(20).index
-    df['studio'] = df['studio'].where(df['studio'].isin(top_studios), 'Other')
-    studio_dummies = pd.get_dummies(df['studio'], prefix='studio')
-    
-    # Feature creation
-    if 'favorites' in df.columns and 'members' in df.columns:
-        df['fav_member_ratio'] = df['favorites'] / df['members']
-    
-    # Select base features
-    base_features = df[['episodes', 'duration_min', 'aired_from_year', 'log_members']]
-    if 'fav_member_ratio' in df.columns:
-        base_features['fav_member_ratio'] = df['fav_member_ratio']
-    
-    # Combine all features
-    features = pd.concat([
-        base_features,
-        genres_dummies,
-        studio_dummies
-    ], axis=1)
-    
-    # Handle any remaining NaN values
-    features = features.fillna(0)
-    
-    return features, df['successful']
-
-# Main model building function
-def build_model(X_train, X_test, y_train, y_test):
-    # Model training
-    clf = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=10,
-        min_samples_split=10,
-        random_state=42
-    )
-    clf.fit(X_train, y_train)
-    
-    # Predictions
-    y_pred = clf.predict(X_test)
-    y_proba = clf.predict_proba(X_test)[:,1]
+@st.cache_resource(max_entries=4)
+def load_predictor(key):
+    return Predictor(load_registered_model(key))
 
-    threshold = 0.6 
-    y_pred = (y_proba >= threshold).astype(int)
-    
-    return clf, y_pred, y_proba
+@st.cache_resource(max_entries=4)
+def load_registered_evaluation(key):
+    return load_evaluation(key)
+
+# Poll the worker and rerun the page once it has saved ``ready``
+@st.fragment(run_every=2)
+def show_training_progress(key, ready):
+    if ready.exists():
+        st.rerun()
+    state = read_progress(key) or {'stage': 'starting', 'done': 0, 'total': 0}
+    if state['stage'] == 'failed':
+        st.error("Training the model failed.")
+        st.code(state.get('error', ''))
+        if st.button("Retry training"):
+            start_training(key, retry=True)
+        return
+    stages = {'trees': "Fitting trees", 'folds': "Cross-validation fits"}
+    text = stages.get(state['stage'], "Preparing features")
+    if state['total']:
+        text += f" ({state['done']}/{state['total']})"
+    st.progress(state['done'] / state['total'] if state['total'] else 0.0, text=text)
+
+model_key = catalog_model_key()
+start_training(model_key)
+if model_path(model_key).exists():
+    model = load_registered_model(model_key)
+else:
+    fallback_key = latest_key()
+    if fallback_key is None:
+        st.info("Training the model for the first time; the page will load when it is ready.")
+        show_training_progress(model_key, model_path(model_key))
+        st.stop()
+    st.info("The catalog or model settings changed. Showing the last trained model while the new one trains.")
+    show_training_progress(model_key, model_path(model_key))
+    model = load_registered_model(fallback_key)
 
-# Execute preprocessing
-features, labels = preprocess_data(df_anime)
-X_train, X_test, y_train, y_test = train_test_split(features, labels, test_size=0.2, random_state=42)
-clf, y_pred, y_proba = build_model(X_train, X_test, y_train, y_test)
+clf = model.clf
+feature_columns = model.feature_columns
+predictor = load_predictor(model.key)
+y_test, y_pred, y_proba = model.y_test, model.y_pred, model.y_proba
 
 # Create tabs for organization
 tab1, tab2, tab3 = st.tabs(["📊 Model Performance", "🔮 Make Predictions", "💡 Feature Importance"])
@@ -211,41 +191,98 @@ with tab1:
     
     # Cross-validation scores
     st.subheader("Cross-Validation Performance")
-    cv_scores = cross_val_score(clf, features, labels, cv=5)
-    
-    fig_cv = go.Figure(data=[
-        go.Bar(
-            x=[f"Fold {i+1}" for i in range(len(cv_scores))],
-            y=cv_scores,
-            marker_color='royalblue'
+    evaluation = load_registered_evaluation(model.key) if evaluation_path(model.key).exists() else None
+
+    if evaluation is None and model.key == model_key:
+        st.info("Cross-validation is running in the background.")
+        show_training_progress(model_key, evaluation_path(model_key))
+    elif evaluation is None:
+        st.info("This model has not been cross-validated yet.")
+    else:
+        cv_scores = evaluation.cv_scores
+
+        fig_cv = go.Figure(data=[
+            go.Bar(
+                x=[f"Fold {i+1}" for i in range(len(cv_scores))],
+                y=cv_scores,
+                marker_color='royalblue'
+            )
+        ])
+
+        fig_cv.add_shape(
+            type="line",
+            x0=-0.5,
+            x1=len(cv_scores)-0.5,
+            y0=cv_scores.mean(),
+            y1=cv_scores.mean(),
+            line=dict(color="red", width=2, dash="dash"),
+        )
+
+        fig_cv.add_annotation(
+            x=len(cv_scores)-1,
+            y=cv_scores.mean(),
+            text=f"Mean: {cv_scores.mean():.3f}",
+            showarrow=True,
+            arrowhead=2,
         )
-    ])
-    
-    fig_cv.add_shape(
-        type="line",
-        x0=-0.5,
-        x1=len(cv_scores)-0.5,
-        y0=cv_scores.mean(),
-        y1=cv_scores.mean(),
-        line=dict(color="red", width=2, dash="dash"),
-    )
-    
-    fig_cv.add_annotation(
-        x=len(cv_scores)-1,
-        y=cv_scores.mean(),
-        text=f"Mean: {cv_scores.mean():.3f}",
-        showarrow=True,
-        arrowhead=2,
-    )
-    
-    fig_cv.update_layout(
-        title="Cross-Validation Accuracy Scores",
-        xaxis_title="Validation Fold",
-        yaxis_title="Accuracy",
-        yaxis=dict(range=[0.5, 1]),
-    )
-    
-    st.plotly_chart(fig_cv)
+
+        fig_cv.update_layout(
+            title="Cross-Validation Accuracy Scores",
+            xaxis_title="Validation Fold",
+            yaxis_title="Accuracy",
+            yaxis=dict(range=[0.5, 1]),
+        )
+
+        st.plotly_chart(fig_cv)
+
+        cv_col1, cv_col2 = st.columns(2)
+
+        # ROC curve of every validation fold
+        with cv_col1:
+            fig_fold_roc = go.Figure()
+            for fold, ((fold_fpr, fold_tpr), fold_auc) in enumerate(zip(evaluation.roc, evaluation.folds['auc'])):
+                fig_fold_roc.add_trace(go.Scatter(
+                    x=fold_fpr, y=fold_tpr, mode='lines',
+                    name=f"Fold {fold+1} (AUC = {fold_auc:.3f})"
+                ))
+            fig_fold_roc.add_shape(
+                type='line', line=dict(dash='dash'),
+                x0=0, x1=1, y0=0, y1=1
+            )
+            fig_fold_roc.update_layout(
+                title=f"ROC Curve per Fold (mean AUC = {evaluation.folds['auc'].mean():.3f})",
+                xaxis_title="False Positive Rate",
+                yaxis_title="True Positive Rate",
+                xaxis_range=[0, 1],
+                yaxis_range=[0, 1],
+                height=450,
+            )
+            st.plotly_chart(fig_fold_roc, use_container_width=True)
+
+        # Learning curve: mean accuracy over folds, with one standard deviation band
+        with cv_col2:
+            curve = evaluation.curve_summary()
+            fig_curve = go.Figure()
+            for side, name, color in [('train', 'Training', 'royalblue'), ('test', 'Validation', 'orange')]:
+                upper = curve[f'{side}_mean'] + curve[f'{side}_std']
+                lower = curve[f'{side}_mean'] - curve[f'{side}_std']
+                fig_curve.add_trace(go.Scatter(
+                    x=list(curve['train_rows']) + list(curve['train_rows'][::-1]),
+                    y=list(upper) + list(lower[::-1]),
+                    fill='toself', fillcolor=color, opacity=0.2,
+                    line=dict(width=0), hoverinfo='skip', showlegend=False
+                ))
+                fig_curve.add_trace(go.Scatter(
+                    x=curve['train_rows'], y=curve[f'{side}_mean'],
+                    mode='lines+markers', name=name, line=dict(color=color)
+                ))
+            fig_curve.update_layout(
+                title="Learning Curve",
+                xaxis_title="Training Rows",
+                yaxis_title="Accuracy",
+                height=450,
+            )
+            st.plotly_chart(fig_curve, use_container_width=True)
 
 with tab2:
     st.header("Make Your Own Predictions")
@@ -260,24 +297,15 @@ with tab2:
         year = st.slider("Release Year", 1990, 2025, 2020)
         members = st.slider("Expected Member Count", 100, 1000000, 50000)
         
-        # Calculate log members
-        log_members = np.log1p(members)
-        
         # Genre selection
-        all_genres = [col for col in features.columns if col not in [
-            'episodes', 'duration_min', 'aired_from_year', 'log_members', 'fav_member_ratio'
-        ] and not col.startswith('studio_')]
-        
-        selected_genres = st.multiselect("Select Genres", all_genres, default=["Action"])
+        selected_genres = st.multiselect("Select Genres", predictor.genres, default=["Action"])
     
     with col2:
         # Studio selection
-        studio_cols = [col for col in features.columns if col.startswith('studio_')]
-        studios = [col.replace('studio_', '') for col in studio_cols]
-        selected_studio = st.selectbox("Select Studio", studios)
+        selected_studio = st.selectbox("Select Studio", predictor.studios)
         
         # Optional: Favorite to member ratio if available
-        if 'fav_member_ratio' in features.columns:
+        if 'fav_member_ratio' in feature_columns:
             fav_ratio = st.slider("Favorites to Member Ratio", 0.0, 0.5, 0.05, 0.01)
         else:
             fav_ratio = 0.05
@@ -285,33 +313,14 @@ with tab2:
         # Prediction button
         predict_btn = st.button("Predict Success", type="primary", use_container_width=True)
         
-        # Prepare input data
+        # Make prediction, successful at the same threshold as the evaluation
         if predict_btn:
-            # Create input dataframe with same structure as training features
-            input_data = pd.DataFrame(0, index=[0], columns=features.columns)
-            
-            # Set values
-            input_data.loc[0, 'episodes'] = episodes
-            input_data.loc[0, 'duration_min'] = duration
-            input_data.loc[0, 'aired_from_year'] = year
-            input_data.loc[0, 'log_members'] = log_members
-            
-            if 'fav_member_ratio' in input_data.columns:
-                input_data.loc[0, 'fav_member_ratio'] = fav_ratio
-                
-            # Set genres
-            for genre in selected_genres:
-                if genre in input_data.columns:
-                    input_data.loc[0, genre] = 1
-                    
-            # Set studio
-            studio_col = f"studio_{selected_studio}"
-            if studio_col in input_data.columns:
-                input_data.loc[0, studio_col] = 1
-                
-            # Make prediction
-            prediction = clf.predict(input_data)[0]
-            probability = clf.predict_proba(input_data)[0][1]
+            started = time.perf_counter()
+            prediction, probability = predictor.predict(
+                episodes, duration, year, members, fav_ratio,
+                genres=selected_genres, studio=selected_studio,
+            )
+            model_ms = (time.perf_counter() - started) * 1000
             
             # Display result
             result_container = st.container()
@@ -349,12 +358,67 @@ with tab2:
                 )
                 
                 st.plotly_chart(fig_gauge, use_container_width=True)
+                st.caption(f"Scored in {model_ms:.2f} ms")
+
+    # Batch scoring of uploaded candidates
+    st.divider()
+    st.subheader("Batch Scoring")
+    st.markdown("Upload a CSV or Parquet file with one anime per row to score them all at once. "
+                "Columns are matched to the fields of the template; other columns are kept in the results.")
+
+    st.download_button(
+        "Download Template",
+        batch_template().to_csv(index=False),
+        file_name="anime_batch_template.csv",
+        mime="text/csv",
+    )
+    uploaded = st.file_uploader("Upload Anime to Score", type=["csv", "parquet"])
+
+    batch = None
+    if uploaded is not None:
+        try:
+            batch = score_batch(model, read_batch(uploaded))
+        except (ValueError, OSError) as exc:
+            # Unreadable files and values the model cannot take
+            st.error(f"Could not score {uploaded.name}: {exc}")
+
+    if batch is not None:
+        scores = batch.scores
+
+        batch_cols = st.columns(3)
+        batch_cols[0].metric("Anime Scored", f"{len(scores):,}")
+        batch_cols[1].metric("Predicted Successful", f"{int(scores['predicted_success'].sum()):,}")
+        batch_cols[2].metric("Scoring Time", f"{batch.seconds * 1000:.0f} ms")
+
+        st.caption("Columns used: " + (", ".join(f"{col} → {field}" for col, field in batch.mapping.items()) or "none"))
+        if batch.missing:
+            st.warning("Not found in the file, filled with defaults: " + ", ".join(batch.missing))
+        if batch.unknown_genres:
+            st.warning("Genres the model does not know, ignored: " + ", ".join(batch.unknown_genres))
+
+        st.dataframe(
+            scores.sort_values('success_probability', ascending=False),
+            use_container_width=True,
+            column_config={
+                'success_probability': st.column_config.ProgressColumn(
+                    "Success Probability", format="%.3f", min_value=0.0, max_value=1.0
+                ),
+            },
+        )
+
+        st.download_button(
+            "Download Scored Anime",
+            scores.to_csv(index=False),
+            file_name="scored_anime.csv",
+            mime="text/csv",
+            type="primary",
+        )
 
 with tab3:
     st.header("Feature Importance Analysis")
     
     # Get feature importances
-    importances = pd.Series(clf.feature_importances_, index=features.columns)
+    importances = pd.Series(clf.feature_importances_, index=feature_columns)
     top_importances = importances.nlargest(15)
     
     # Plot feature importances
@@ -389,11 +453,8 @@ with tab3:
     # Feature correlations with success
     st.subheader("Feature Correlations with Success")
     
-    # Add success to features for correlation
-    corr_df = pd.concat([features, labels], axis=1)
-    
-    # Calculate correlations with success
-    success_corr = corr_df.corr()['successful'].sort_values(ascending=False).drop('successful')
+    # Correlations with success, computed at training time
+    success_corr = model.success_corr
     top_pos_corr = success_corr.nlargest(10)
     top_neg_corr = success_corr.nsmallest(10)
     
@@ -454,11 +515,7 @@ with st.sidebar:
     
     # Model parameters
     st.markdown("### Model Parameters")
-    st.code("""
-RandomForestClassifier(
-    n_estimators=100,
-    max_depth=10,
-    min_samples_split=10,
-    random_state=42
-)
-    """)
+    st.code("RandomForestClassifier(\n"
+            + "".join(f"    {name}={value!r},\n" for name, value in model.params.items())
+            + ")")
+    st.caption(f"Model `{model.key}`")
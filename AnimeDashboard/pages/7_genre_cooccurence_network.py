@@ -2,13 +2,18 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-from collections import Counter
-from itertools import combinations
 import networkx as nx
 from streamlit.components.v1 import html
 import time
 import numpy as np
 
+from animelens.cooccurrence import (
+    adjacency, build_graph, cooccurrence_matrix, cooccurrence_timeline, genre_sizes, pair_table,
+)
+from animelens.data import catalog_genres, load_anime
+from animelens.genres import any_genre
+from animelens.layout import LayoutCache
+
 # Page configuration
 st.set_page_config(page_title="Anime Genre Network", layout="wide")
 
@@ -39,13 +44,7 @@ st.title("🎭 Anime Genre Co-occurrence Network")
 # Load and preprocess data
 @st.cache_data
 def load_data():
-    df = pd.read_csv('./data/anime_cleaned.csv')
-    df['genre'] = df['genre'].fillna('Unknown')
-    df['genre'] = df['genre'].str.split(', ')
-    
-    # Add year information if available
-    if 'aired_from_year' in df.columns:
-        df['aired_from_year'] = pd.to_numeric(df['aired_from_year'], errors='coerce')
+    df = load_anime(['title', 'score', 'aired_from_year', 'genre', 'genre_bits'])
     
     return df
 
@@ -80,68 +79,58 @@ else:
     df_filtered = df
 
 # Genre focus
-all_genres = set()
-for genres in df['genre']:
-    if isinstance(genres, list):
-        all_genres.update(genres)
+genre_vocab = catalog_genres()
 
 focus_genre = st.sidebar.selectbox(
     "Focus on specific genre",
-    ["None"] + sorted(all_genres),
+    ["None"] + genre_vocab,
     help="Highlight a specific genre and its connections"
 )
 
 # Visualization options
 st.sidebar.header("🎨 Visualization Options")
+viz_styles = ["Network Graph", "Heatmap Matrix", "Chord Diagram"]
+if 'aired_from_year' in df.columns:
+    viz_styles.append("Network Over Time")
 viz_style = st.sidebar.radio(
     "Visualization Type",
-    ["Network Graph", "Heatmap Matrix", "Chord Diagram"],
+    viz_styles,
     help="Choose how to visualize genre relationships"
 )
 
-# Count genre pairs and build co-occurrence data
+# Per-year genre x genre co-occurrence matrices as prefix sums; any year
+# window is one subtraction and every threshold is just a mask over it
 @st.cache_data
-def build_cooccurrence_data(df, threshold=30):
-    # Count pairs
-    pair_counter = Counter()
-    genre_counter = Counter()
-    
-    for genres in df['genre']:
-        if isinstance(genres, list) and len(genres) > 1:
-            genre_counter.update(genres)
-            pairs = combinations(sorted(set(genres)), 2)
-            pair_counter.update(pairs)
-    
-    # Filter by threshold
-    filtered_pairs = {pair: count for pair, count in pair_counter.items() if count >= threshold}
-    
-    # Create edge list
-    edges = [(g1, g2, count) for (g1, g2), count in filtered_pairs.items()]
-    
-    # Build graph
-    G = nx.Graph()
-    
-    for genre, count in genre_counter.items():
-        G.add_node(genre, size=count)
-    
-    for g1, g2, weight in edges:
-        G.add_edge(g1, g2, weight=weight)
-    
-    return G, genre_counter, filtered_pairs, edges
+def build_cooccurrence_timeline(genre_bits, years):
+    return cooccurrence_timeline(genre_bits, years, genre_vocab)
+
+if 'aired_from_year' in df.columns:
+    timeline = build_cooccurrence_timeline(df['genre_bits'].to_numpy(), df['aired_from_year'].to_numpy())
+    cooccurrence = timeline.window(*year_range)
+else:
+    cooccurrence = cooccurrence_matrix(df['genre_bits'].to_numpy(), genre_vocab)
+genre_counter = genre_sizes(cooccurrence, genre_vocab)
+pairs_df = pair_table(cooccurrence, genre_vocab, threshold)
+G = build_graph(cooccurrence, genre_vocab, threshold)
 
-G, genre_counter, filtered_pairs, edges = build_cooccurrence_data(df_filtered, threshold)
+# Layouts are cached per session by the graph's edge set, so a recolor
+# (e.g. changing the focus genre) never re-runs the layout, and new
+# thresholds or year windows warm-start from the current positions
+if 'genre_layouts' not in st.session_state:
+    st.session_state['genre_layouts'] = LayoutCache()
+layouts = st.session_state['genre_layouts']
 
 # Create tabs for different views
 tab1, tab2, tab3 = st.tabs(["Network Visualization", "Genre Analytics", "Top Combinations"])
 
 # Tab 1: Network visualization
 with tab1:
-    if not edges:
+    if pairs_df.empty:
         st.warning(f"No genre pairs meet the threshold of {threshold}. Try lowering the threshold.")
     else:
         if viz_style == "Network Graph":
-            # Generate NetworkX positions
-            pos = nx.spring_layout(G, seed=42)
+            # Cached, warm-started positions
+            pos = layouts.layout(G)
             
             # Create edge traces
             edge_x = []
@@ -248,15 +237,10 @@ with tab1:
                 st.markdown(f"<div class='stats-card'><h3>Network Density</h3><p style='font-size:24px;'>{density:.3f}</p></div>", unsafe_allow_html=True)
             
         elif viz_style == "Heatmap Matrix":
-            # Create adjacency matrix
-            genres = sorted(list(G.nodes()))
-            matrix = np.zeros((len(genres), len(genres)))
-            
-            # Fill matrix with co-occurrence counts
-            for i, g1 in enumerate(genres):
-                for j, g2 in enumerate(genres):
-                    if G.has_edge(g1, g2):
-                        matrix[i][j] = G[g1][g2]['weight']
+            # Thresholded slice of the co-occurrence matrix
+            genres = list(genre_counter.index)
+            idx = pd.Index(genre_vocab).get_indexer(genres)
+            matrix = adjacency(cooccurrence, threshold)[np.ix_(idx, idx)]
             
             # Create heatmap
             fig = px.imshow(
@@ -278,14 +262,9 @@ with tab1:
             
         elif viz_style == "Chord Diagram":
             # Prepare data for chord diagram
-            genres = sorted(list(G.nodes()))
-            matrix = np.zeros((len(genres), len(genres)))
-            
-            # Fill matrix with co-occurrence counts
-            for i, g1 in enumerate(genres):
-                for j, g2 in enumerate(genres):
-                    if G.has_edge(g1, g2):
-                        matrix[i][j] = G[g1][g2]['weight']
+            genres = list(genre_counter.index)
+            idx = pd.Index(genre_vocab).get_indexer(genres)
+            matrix = adjacency(cooccurrence, threshold)[np.ix_(idx, idx)]
             
             # Create chord diagram
             fig = go.Figure(go.Heatmap(
@@ -308,14 +287,91 @@ with tab1:
             
             st.plotly_chart(fig, use_container_width=True)
 
+        elif viz_style == "Network Over Time":
+            # Step through the selected years with a trailing window; each
+            # frame is a prefix-sum lookup, nothing is recounted
+            col1, col2 = st.columns(2)
+            with col1:
+                frame_years = st.slider("Years per frame", 1, 10, 5)
+            with col2:
+                frame_threshold = st.slider("Minimum co-occurrences per frame", 1, 50, 5)
+            
+            # Keep node positions fixed so only the edges and sizes change
+            pos = layouts.layout(G)
+            nodes = list(G.nodes())
+            node_idx = pd.Index(genre_vocab).get_indexer(nodes)
+            node_x = [pos[node][0] for node in nodes]
+            node_y = [pos[node][1] for node in nodes]
+            
+            frames = []
+            for year in range(year_range[0], year_range[1] + 1):
+                counts = timeline.window(year - frame_years + 1, year)[np.ix_(node_idx, node_idx)]
+                rows, cols = np.nonzero(np.triu(counts, 1) >= frame_threshold)
+                
+                edge_x, edge_y = [], []
+                for i, j in zip(rows, cols):
+                    edge_x.extend([node_x[i], node_x[j], None])
+                    edge_y.extend([node_y[i], node_y[j], None])
+                
+                sizes = np.diag(counts)
+                frames.append(go.Frame(
+                    name=str(year),
+                    data=[
+                        go.Scatter(x=edge_x, y=edge_y, mode='lines',
+                                   line=dict(width=0.8, color='#888'), hoverinfo='none'),
+                        go.Scatter(
+                            x=node_x, y=node_y,
+                            mode='markers+text',
+                            text=nodes,
+                            textposition="top center",
+                            hovertext=[f"{node}: {size} anime" for node, size in zip(nodes, sizes)],
+                            hoverinfo='text',
+                            marker=dict(size=np.sqrt(sizes) * 1.5 + 2, color='skyblue',
+                                        line=dict(width=1, color='#333')),
+                        ),
+                    ],
+                    layout=go.Layout(title=f"Genre Network {year - frame_years + 1}–{year}"),
+                ))
+            
+            fig = go.Figure(data=frames[0].data, frames=frames, layout=frames[0].layout)
+            fig.update_layout(
+                showlegend=False,
+                hovermode='closest',
+                margin=dict(b=0, l=0, r=0, t=40),
+                xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+                yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+                height=700,
+                template='plotly_white',
+                updatemenus=[dict(
+                    type='buttons',
+                    showactive=False,
+                    buttons=[
+                        dict(label='▶ Play', method='animate',
+                             args=[None, dict(frame=dict(duration=400, redraw=True), fromcurrent=True)]),
+                        dict(label='⏸ Pause', method='animate',
+                             args=[[None], dict(frame=dict(duration=0, redraw=False), mode='immediate')]),
+                    ],
+                )],
+                sliders=[dict(
+                    currentvalue=dict(prefix="Year: "),
+                    steps=[
+                        dict(label=frame.name, method='animate',
+                             args=[[frame.name], dict(frame=dict(duration=0, redraw=True), mode='immediate')])
+                        for frame in frames
+                    ],
+                )],
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+
 # Tab 2: Genre Analytics
 with tab2:
     st.header("Genre Analytics")
     
     # Top genres by frequency
     top_genres = pd.DataFrame({
-        'Genre': list(genre_counter.keys()),
-        'Anime Count': list(genre_counter.values())
+        'Genre': genre_counter.index,
+        'Anime Count': genre_counter.values
     }).sort_values('Anime Count', ascending=False).head(15)
     
     # Top connected genres
@@ -398,9 +454,7 @@ with tab2:
             # Show example anime with this genre
             if 'genre' in df.columns and 'title' in df.columns:
                 st.subheader(f"Example Anime with '{selected_genre}' Genre")
-                genre_anime = df_filtered[df_filtered['genre'].apply(
-                    lambda x: selected_genre in x if isinstance(x, list) else False
-                )]
+                genre_anime = df_filtered[any_genre(df_filtered['genre_bits'], [selected_genre], genre_vocab)]
                 
                 cols_to_show = ['title', 'score', 'aired_from_year'] if all(col in genre_anime.columns for col in ['score', 'aired_from_year']) else ['title']
                 st.dataframe(genre_anime[cols_to_show].head(10), use_container_width=True)
@@ -411,13 +465,8 @@ with tab2:
 with tab3:
     st.header("Top Genre Combinations")
     
-    # Create a dataframe of all pairs
-    if filtered_pairs:
-        pairs_df = pd.DataFrame([
-            {'Genre 1': g1, 'Genre 2': g2, 'Co-occurrences': count}
-            for (g1, g2), count in filtered_pairs.items()
-        ]).sort_values('Co-occurrences', ascending=False)
-        
+    # All pairs above the threshold
+    if not pairs_df.empty:
         # Top pairs
         st.subheader("Most Common Genre Combinations")
         fig = px.bar(